@@ -1,28 +1,90 @@
 """Helper functions for week 5, which are not relevant for the tutorial."""
 
-import cebra.datasets
+import hashlib
+import os
+import warnings
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
 import statsmodels.api as sm
 import numpy as np
+from scipy.special import gammaln, xlogy
+from statsmodels.tools.sm_exceptions import ConvergenceWarning
+
+# the arrays of every dataset are kept here after the first load, so later
+# sessions neither import cebra nor convert the tensors again
+CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "nx435")
+
 
 class HippocampusDataset():
+    """The rat hippocampus dataset, as read-only NumPy arrays.
+
+    Each array is converted from the cebra tensors once, saved to
+    `cache_dir/<name>/` and memory-mapped from there; the same array
+    object is returned on every access. With `cache_dir=None` the arrays
+    are only kept in memory.
+    """
+
+    def __init__(self, name='rat-hippocampus-single-achilles', cache_dir=CACHE_DIR):
+        self.name = name
+        self.cache_dir = cache_dir
+        self._raw_data = None
+        self._arrays = {}
+
+    @property
+    def raw_data(self):
+        """The cebra dataset, only loaded if an array is not cached yet."""
+        if self._raw_data is None:
+            import cebra.datasets
+            self._raw_data = cebra.datasets.init(self.name)
+        return self._raw_data
+
+    def _convert(self, key):
+        if key == "neural":
+            # column-major, so that the spikes of one neuron are contiguous
+            return np.asfortranarray(self.raw_data.neural.numpy())
+        if key == "position":
+            return np.ascontiguousarray(self.raw_data.index[:, 0].numpy())
+        if key == "direction":
+            return np.ascontiguousarray(self.raw_data.index[:, 1].numpy())
+        raise KeyError(key)
+
+    def _load(self, key):
+        if self.cache_dir is not None:
+            path = os.path.join(self.cache_dir, self.name, key + ".npy")
+            if not os.path.exists(path):
+                try:
+                    os.makedirs(os.path.dirname(path), exist_ok=True)
+                    # write under another name first, so a cache file is never partial
+                    tmp = path + ".%d.tmp" % os.getpid()
+                    np.save(tmp, self._convert(key))
+                    os.replace(tmp + ".npy", path)
+                except OSError:
+                    pass
+            if os.path.exists(path):
+                return np.asarray(np.load(path, mmap_mode='r'))
+        array = self._convert(key)
+        array.flags.writeable = False
+        return array
 
-    def __init__(self):
-        self.raw_data = cebra.datasets.init('rat-hippocampus-single-achilles')
+    def _array(self, key):
+        if key not in self._arrays:
+            self._arrays[key] = self._load(key)
+        return self._arrays[key]
 
     def get_neuron_spikes(self, neuron_idx):
-        return self.raw_data.neural[:, neuron_idx].numpy()
+        return self.all_spikes_binned[:, neuron_idx]
     
     @property
     def all_spikes_binned(self):
-        return self.raw_data.neural.numpy()
+        return self._array("neural")
 
     @property
     def position(self):
-        return self.raw_data.index[:, 0].numpy()
+        return self._array("position")
 
     @property
     def direction(self):
-        return self.raw_data.index[:, 1].numpy()
+        return self._array("direction")
 
     @property
     def shape(self):
@@ -38,10 +100,176 @@ class HippocampusDataset():
 
     @property
     def time(self):
-        return np.arange(len(self)) / self.sampling_rate_hz
+        if "time" not in self._arrays:
+            time = np.arange(len(self)) / self.sampling_rate_hz
+            time.flags.writeable = False
+            self._arrays["time"] = time
+        return self._arrays["time"]
 
     def __len__(self):
-        return len(self.all_spikes_binned)
+        return self.shape[0]
+
+
+def add_constant(design_matrix):
+    """The design matrix with a column of ones in front, for the intercept."""
+    X = np.empty((len(design_matrix), design_matrix.shape[1] + 1))
+    X[:, 0] = 1.
+    X[:, 1:] = design_matrix
+    return X
+
+
+# weighted_gram works through the rows in chunks whose temporaries take
+# about this many bytes
+GRAM_MAX_BYTES = 32 * 2**20
+
+
+def weighted_gram(X, W, max_bytes=GRAM_MAX_BYTES):
+    """`X.T @ diag(W[:, k]) @ X` for every column `k` of W, shape (k, p, p).
+
+    With many columns, they share one matrix product per chunk of rows, and
+    only the upper triangle is computed; forming the pairwise products of
+    the p features costs more than it saves for a few columns, which get
+    one BLAS product each. The rows are taken in chunks sized so that the
+    temporaries stay around `max_bytes`, whatever n and p are.
+    """
+    n, p = X.shape
+    k = W.shape[1]
+    if 0 < k < max(16, p // 2):
+        step = max(1, max_bytes // (8 * p))
+        gram = np.zeros((k, p, p))
+        for start in range(0, n, step):
+            Xc = X[start:start + step]
+            Wc = W[start:start + step]
+            for j in range(k):
+                gram[j] += (Xc * Wc[:, j, None]).T @ Xc
+        return gram
+    rows, cols = np.triu_indices(p)
+    # the two gathered factors and their product
+    step = max(1, max_bytes // (3 * 8 * len(rows)))
+    tri = np.zeros((k, len(rows)))
+    for start in range(0, n, step):
+        Xc = X[start:start + step]
+        tri += W[start:start + step].T @ (Xc[:, rows] * Xc[:, cols])
+    gram = np.empty((k, p, p))
+    gram[:, rows, cols] = tri
+    gram[:, cols, rows] = tri
+    return gram
+
+
+def ridge_penalty(p, alpha):
+    """`alpha` on the diagonal, except for the constant (the first parameter)."""
+    penalty = np.diag(np.full(p, float(alpha)))
+    penalty[0, 0] = 0.
+    return penalty
+
+
+def poisson_irls(X, Y, max_iter=100, tol=1e-6, start_params=None, alpha=0.):
+    """Fit a Poisson GLM with log link to every column of Y at once.
+
+    X includes the constant column. This runs the same iteratively
+    reweighted least squares as statsmodels, from the same starting point,
+    but for all columns together; a column stops as soon as no parameter
+    changes by more than `tol`. Returns the parameters, shape (p, columns),
+    which are NaN for columns without any spikes. `start_params` of the
+    same shape, e.g. from an earlier fit, start the iterations there.
+    With `alpha`, the log-likelihood (summed over time bins) is penalized
+    by `alpha / 2` times the squared norm of the filter parameters.
+    """
+    X = np.asarray(X, dtype=float)
+    Y = np.asarray(Y, dtype=float)
+    params = np.full((X.shape[1], Y.shape[1]), np.nan)
+    penalty = ridge_penalty(X.shape[1], alpha)
+    active = np.flatnonzero(Y.sum(axis=0) > 0)
+    y = Y[:, active]
+    if start_params is None:
+        mu = (y + y.mean(axis=0)) / 2
+        eta = np.log(mu)
+        previous = None
+    else:
+        previous = np.asarray(start_params, dtype=float)[:, active]
+        eta = X @ previous
+        mu = np.exp(eta)
+    for _ in range(max_iter):
+        # weighted least squares with weights mu and working response
+        # z = eta + (y - mu) / mu, so the right-hand side is X.T @ (mu * z)
+        rhs = X.T @ (mu * eta + y - mu)
+        b = np.linalg.solve(weighted_gram(X, mu) + penalty, rhs.T[:, :, None])[:, :, 0].T
+        params[:, active] = b
+        if previous is not None:
+            going = np.any(np.abs(b - previous) > tol, axis=0)
+            active, b, y = active[going], b[:, going], y[:, going]
+            if len(active) == 0:
+                break
+        eta = X @ b
+        mu = np.exp(eta)
+        previous = b
+    else:
+        warnings.warn(f"{len(active)} columns did not converge", ConvergenceWarning)
+    return params
+
+
+def poisson_llf(Y, mu):
+    """Poisson log-likelihood of the counts Y under rates mu, per column."""
+    return (xlogy(Y, mu) - mu - gammaln(Y + 1)).sum(axis=0)
+
+
+def _chunks(n, chunk_size):
+    return [(start, min(start + chunk_size, n)) for start in range(0, n, chunk_size)]
+
+
+def _chunk_rows(X, Y, max_bytes):
+    # rows whose copy of X (with the constant) and per-column arrays fit max_bytes
+    return max(1, max_bytes // (8 * (2 * X.shape[1] + 4 * np.shape(Y)[1] + 1)))
+
+
+def poisson_irls_chunked(X, Y, chunk_size=None, max_iter=100, tol=1e-6, start_params=None, alpha=0.,
+                         max_bytes=GRAM_MAX_BYTES):
+    """`poisson_irls` for recordings that do not fit in memory.
+
+    X (without the constant column) and Y (time, columns) are only read
+    `chunk_size` rows at a time, so they can be memory-mapped arrays or
+    `lag_matrix` views. Every iteration is one pass over the data that adds
+    up X.T W X and X.T W z chunk by chunk; the iterations, and so the
+    result, are those of `poisson_irls`. The arrays made for each chunk
+    take about `max_bytes` with the default `chunk_size`, and the
+    temporaries of `weighted_gram` get the same budget, so memory does not
+    grow with the length of the recording.
+    """
+    n = len(X)
+    if chunk_size is None:
+        chunk_size = _chunk_rows(X, Y, max_bytes)
+    chunks = _chunks(n, chunk_size)
+    total = sum(np.asarray(Y[a:b], dtype=float).sum(axis=0) for a, b in chunks)
+    mean = total / n
+    p = X.shape[1] + 1
+    params = np.full((p, len(total)), np.nan)
+    active = np.flatnonzero(total > 0)
+    previous = None if start_params is None else np.asarray(start_params, dtype=float)[:, active]
+    for _ in range(max_iter):
+        gram = np.zeros((len(active), p, p))
+        rhs = np.zeros((p, len(active)))
+        for a, b in chunks:
+            Xc = add_constant(X[a:b])
+            y = np.asarray(Y[a:b], dtype=float)[:, active]
+            if previous is None:
+                mu = (y + mean[active]) / 2
+                eta = np.log(mu)
+            else:
+                eta = Xc @ previous
+                mu = np.exp(eta)
+            gram += weighted_gram(Xc, mu, max_bytes)
+            rhs += Xc.T @ (mu * eta + y - mu)
+        b = np.linalg.solve(gram + ridge_penalty(p, alpha), rhs.T[:, :, None])[:, :, 0].T
+        params[:, active] = b
+        if previous is not None:
+            going = np.any(np.abs(b - previous) > tol, axis=0)
+            active, b = active[going], b[:, going]
+            if len(active) == 0:
+                break
+        previous = b
+    else:
+        warnings.warn(f"{len(active)} columns did not converge", ConvergenceWarning)
+    return params
 
 
 class GLMModel():
@@ -51,38 +279,351 @@ class GLMModel():
     - fitting the model
     - computing the goodness of fit (the pseudo-R2)
     - making predictions on the dataset
+
+    `spikes` can be one neuron, or a (time, neurons) matrix such as
+    `all_spikes_binned`. Then all neurons are fitted together on the shared
+    design matrix, optionally in `n_jobs` workers, and the parameters,
+    `score()` and `predict()` have one column (or entry) per neuron.
+    `alpha` adds a ridge penalty on the filter (see `poisson_irls`).
+
+    On a plain in-memory design matrix, a single neuron without penalty is
+    fitted by statsmodels, and anything else by `poisson_irls`, all neurons
+    at once. Other design matrices go through `fit_chunked`, which reads
+    them a chunk of rows at a time and adds the constant per chunk, so
+    `lag_matrix` views, `ColumnStack`s and memory maps are never copied
+    whole.
     """
 
-    def __init__(self):
+    def __init__(self, max_iter=100, tol=1e-6, alpha=0.):
         self.link_function = sm.families.links.Log()
         self.family = sm.families.Poisson(link = self.link_function)
+        self.max_iter = max_iter
+        self.tol = tol
+        self.alpha = alpha
+
+    def fit(self, design_matrix, spikes, n_jobs=None, start_params=None):
+        spikes = np.asarray(spikes)
+        if type(design_matrix) is not np.ndarray or not design_matrix.flags.c_contiguous:
+            return self.fit_chunked(design_matrix, spikes, start_params=start_params, n_jobs=n_jobs)
+        design_mat_offset = add_constant(design_matrix)
+        if spikes.ndim == 1 and not self.alpha:
+            self._model = sm.GLM(
+                endog=spikes,
+                exog=design_mat_offset,
+                family=self.family
+            )
+            self._results = self._model.fit(
+                start_params=start_params, max_iter=self.max_iter, tol=self.tol,
+                tol_criterion='params',
+            )
+            self._params = self._results.params
+            return self
+
+        spikes_2d = spikes if spikes.ndim == 2 else spikes[:, None]
+        if start_params is not None and np.ndim(start_params) == 1:
+            start_params = np.asarray(start_params)[:, None]
+        if n_jobs is None or n_jobs <= 1:
+            params = poisson_irls(
+                design_mat_offset, spikes_2d, self.max_iter, self.tol, start_params, self.alpha
+            )
+        else:
+            groups = np.array_split(np.arange(spikes_2d.shape[1]), n_jobs)
+            starts = [None if start_params is None else start_params[:, group] for group in groups]
+            with ProcessPoolExecutor(n_jobs) as pool:
+                parts = pool.map(
+                    poisson_irls,
+                    [design_mat_offset] * len(groups),
+                    [spikes_2d[:, group] for group in groups],
+                    [self.max_iter] * len(groups),
+                    [self.tol] * len(groups),
+                    starts,
+                    [self.alpha] * len(groups),
+                )
+                params = np.hstack(list(parts))
+        llf = poisson_llf(spikes_2d, np.exp(design_mat_offset @ params))
+        llnull = poisson_llf(spikes_2d, spikes_2d.mean(axis=0))
+        return self._set_fit(params, llf, llnull, spikes.ndim)
+
+    def fit_chunked(self, design_matrix, spikes, chunk_size=None, start_params=None, n_jobs=None):
+        """Like `fit`, reading only `chunk_size` time bins into memory at a time.
+
+        The `n_jobs` workers are threads, which share the design matrix: a
+        process would get a pickled, dense copy of the views each. By default
+        the chunks of all workers together take about `GRAM_MAX_BYTES`.
+        """
+        spikes_2d = spikes if spikes.ndim == 2 else spikes[:, None]
+        max_bytes = GRAM_MAX_BYTES // max(1, n_jobs or 1)
+        if chunk_size is None:
+            chunk_size = _chunk_rows(design_matrix, spikes_2d, max_bytes)
+        if start_params is not None and np.ndim(start_params) == 1:
+            start_params = np.asarray(start_params)[:, None]
+        if n_jobs is None or n_jobs <= 1:
+            params = poisson_irls_chunked(
+                design_matrix, spikes_2d, chunk_size, self.max_iter, self.tol, start_params,
+                self.alpha, max_bytes,
+            )
+        else:
+            groups = np.array_split(np.arange(spikes_2d.shape[1]), n_jobs)
+            starts = [None if start_params is None else start_params[:, group] for group in groups]
+            with ThreadPoolExecutor(n_jobs) as pool:
+                parts = pool.map(
+                    poisson_irls_chunked,
+                    [design_matrix] * len(groups),
+                    [spikes_2d[:, group] for group in groups],
+                    [chunk_size] * len(groups),
+                    [self.max_iter] * len(groups),
+                    [self.tol] * len(groups),
+                    starts,
+                    [self.alpha] * len(groups),
+                    [max_bytes] * len(groups),
+                )
+                params = np.hstack(list(parts))
+        # one more pass for the log-likelihoods of the model and of the
+        # constant-rate null model
+        llf = total = log_factorials = 0.
+        for a, b in _chunks(len(design_matrix), chunk_size):
+            y = np.asarray(spikes_2d[a:b], dtype=float)
+            llf = llf + poisson_llf(y, np.exp(add_constant(design_matrix[a:b]) @ params))
+            total = total + y.sum(axis=0)
+            log_factorials = log_factorials + gammaln(y + 1).sum(axis=0)
+        mean = total / len(design_matrix)
+        llnull = xlogy(total, mean) - total - log_factorials
+        return self._set_fit(params, llf, llnull, spikes.ndim)
 
-    def fit(self, design_matrix, spikes):
-        design_mat_offset = np.hstack((np.ones((len(design_matrix),1)), design_matrix))
-        self._model = sm.GLM(
-            endog=spikes,
-            exog=design_mat_offset,
-            family=self.family
-        )
-        self._results = self._model.fit(max_iter=100, tol=1e-6, tol_criterion='params')
+    def _set_fit(self, params, llf, llnull, ndim):
+        self._results = None
+        if ndim == 1:
+            params, llf, llnull = params[:, 0], llf[0], llnull[0]
+        self._params, self._llf, self._llnull = params, llf, llnull
+        return self
 
     def predict(self, design_mat):
         return np.exp(self.constant_params + design_mat @ self.filter_params)
 
     def score(self):
+        if self._results is None:
+            # McFadden's pseudo-R2, as statsmodels computes it
+            return 1 - self._llf / self._llnull
         return self._results.pseudo_rsquared(kind='mcf') 
 
     @property
     def filter_params(self):
-        return self._results.params[1:]
+        return self._params[1:]
 
     @property
     def constant_params(self):
-        return self._results.params[0]
+        return self._params[0]
 
 
-def build_design_matrix(filter_size):
-    """For reference, this is a fast way to build the design matrix."""
-    padded_stim = np.hstack((np.zeros(filter_size-1), stim))   # pad early bins of stimulus with zero
-    design_mat = scipy.linalg.hankel(padded_stim[:-filter_size+1], stim[-filter_size:])
-    return design_mat
\ No newline at end of file
+def lag_matrix(x, filter_size):
+    """The last `filter_size` values of x at every time bin, oldest first.
+
+    Row t is `x[t-filter_size+1], ..., x[t]`, with zeros before the start of
+    the recording. Apart from the zero padding nothing is copied: the rows
+    are overlapping, read-only views of one array.
+    """
+    padded = np.concatenate((np.zeros(filter_size - 1), x))
+    return np.lib.stride_tricks.sliding_window_view(padded, filter_size)
+
+
+class ColumnStack:
+    """Row-aligned blocks side by side, used as one design matrix without copying them.
+
+    A slice of rows (`X[a:b]`, `X[indices]`) is returned as one dense array,
+    `X @ w` is computed a chunk of rows at a time, and `np.asarray(X)`
+    builds the full matrix.
+    """
+
+    def __init__(self, blocks):
+        self.blocks = list(blocks)
+        self.shape = (len(self.blocks[0]), sum(block.shape[1] for block in self.blocks))
+        self.ndim = 2
+
+    def __len__(self):
+        return self.shape[0]
+
+    def __getitem__(self, rows):
+        if isinstance(rows, tuple):
+            return np.asarray(self)[rows]
+        return np.hstack([block[rows] for block in self.blocks])
+
+    def __matmul__(self, w):
+        step = max(1, GRAM_MAX_BYTES // (8 * self.shape[1]))
+        return np.concatenate([self[a:b] @ w for a, b in _chunks(len(self), step)])
+
+    def __array__(self, dtype=None, copy=None):
+        return np.hstack(self.blocks).astype(dtype, copy=False)
+
+
+def raised_cosine_basis(filter_size, n_basis, offset=1.):
+    """Raised-cosine bumps over the lags, shape (filter_size, n_basis).
+
+    The bumps are evenly spaced on a log-stretched time axis, so recent lags
+    are resolved finely and long lags coarsely (Pillow et al., 2008). Rows
+    follow the column order of `lag_matrix`, oldest lag first.
+    """
+    stretched = np.log(np.arange(filter_size) + offset)
+    centers = np.linspace(stretched[0], stretched[-1], n_basis)
+    spacing = centers[1] - centers[0] if n_basis > 1 else stretched[-1] - stretched[0] + 1
+    phase = np.clip((stretched[:, None] - centers) * np.pi / (2 * spacing), -np.pi, np.pi)
+    return ((np.cos(phase) + 1) / 2)[::-1]
+
+
+def project_lags(x, basis):
+    """`lag_matrix(x, len(basis)) @ basis`, without building the lag matrix."""
+    padded = np.concatenate((np.zeros(len(basis) - 1), x))
+    return np.stack([np.correlate(padded, b, mode='valid') for b in basis.T], axis=1)
+
+
+def build_design_matrix(stim, filter_size, basis=None):
+    """For reference, this is a fast way to build the design matrix.
+
+    Without `basis` this is the (time, filter_size) lag matrix of the
+    stimulus, as a zero-copy view. With a basis, e.g.
+    `raised_cosine_basis(filter_size, 8)`, the lags are projected onto it
+    and the matrix only has one column per basis function.
+    """
+    if basis is None:
+        return lag_matrix(stim, filter_size)
+    return project_lags(stim, basis)
+
+
+def build_history_matrix(spikes, history_timesteps, basis=None):
+    """Design matrix of the spike history, excluding the bin being predicted."""
+    shifted = np.concatenate(([0.], spikes[:-1]))
+    return build_design_matrix(shifted, history_timesteps, basis)
+
+
+def build_covariate_matrix(data, filter_size, neuron_idx=None, history_timesteps=None,
+                           n_basis=None):
+    """Position and direction lags, and optionally one neuron's spike history.
+
+    The blocks are stacked side by side in a `ColumnStack`, ready for
+    `GLMModel.fit`/`predict`, without copying the lag views.
+    With `n_basis`, every block is compressed onto that many raised cosines.
+    """
+    stim_basis = None if n_basis is None else raised_cosine_basis(filter_size, n_basis)
+    blocks = [
+        build_design_matrix(data.position, filter_size, stim_basis),
+        build_design_matrix(data.direction, filter_size, stim_basis),
+    ]
+    if neuron_idx is not None and history_timesteps:
+        history_basis = None if n_basis is None else raised_cosine_basis(history_timesteps, n_basis)
+        spikes = data.get_neuron_spikes(neuron_idx)
+        blocks.append(build_history_matrix(spikes, history_timesteps, history_basis))
+    return ColumnStack(blocks)
+
+
+def data_hash(*arrays):
+    """A hex digest of the shapes, dtypes and contents of the arrays."""
+    digest = hashlib.sha1()
+    for array in arrays:
+        array = np.ascontiguousarray(array)
+        digest.update(f"{array.shape}{array.dtype}".encode())
+        digest.update(array.view(np.uint8).reshape(-1))
+    return digest.hexdigest()
+
+
+def _cross_validate_filter(stim, spikes, test, filter_size, alphas, max_iter, tol, memo):
+    """Held-out scores of one fold and filter size, shape (alphas, neurons).
+
+    The train and test matrices, with the constant, are built once and the
+    penalties are walked in order, every fit starting from the parameters
+    of the previous one. Results in the `memo` directory are reused.
+    """
+    start, stop = test
+    n_covariates = stim.shape[1]
+    padded = np.concatenate((np.zeros((filter_size - 1, n_covariates)), stim))
+    # (time, covariate, lag) views of the lags, oldest first, copied straight
+    # into matrices that already hold the constant
+    lags = np.lib.stride_tricks.sliding_window_view(padded, filter_size, axis=0)
+    columns = 1 + n_covariates * filter_size
+    X_train = np.ones((len(stim) - (stop - start), columns))
+    X_test = np.ones((stop - start, columns))
+    train = X_train[:, 1:].reshape(len(X_train), n_covariates, filter_size)
+    train[:start], train[start:] = lags[:start], lags[stop:]
+    X_test[:, 1:].reshape(len(X_test), n_covariates, filter_size)[:] = lags[start:stop]
+    Y_train = np.concatenate((spikes[:start], spikes[stop:]))
+    Y_test = spikes[start:stop]
+    llnull = poisson_llf(Y_test, Y_train.mean(axis=0))
+    scores = np.full((len(alphas), spikes.shape[1]), np.nan)
+    params = None
+    for j, alpha in enumerate(alphas):
+        path = None
+        if memo is not None:
+            name = f"{filter_size}-{float(alpha):.17g}-{max_iter}-{float(tol):.17g}.npz"
+            path = os.path.join(memo, name)
+        if path is not None and os.path.exists(path):
+            with np.load(path) as saved:
+                params, scores[j] = saved['params'], saved['score']
+            continue
+        params = poisson_irls(X_train, Y_train, max_iter, tol, params, alpha)
+        scores[j] = 1 - poisson_llf(Y_test, np.exp(X_test @ params)) / llnull
+        if path is not None:
+            # write, then rename, so other processes never see half a file
+            with open(path + '.tmp', 'wb') as f:
+                np.savez(f, params=params, score=scores[j])
+            os.replace(path + '.tmp', path)
+    return scores
+
+
+def cross_validate(stim, spikes, filter_sizes, alphas=(0.,), n_folds=5, n_jobs=None,
+                   cache_dir=CACHE_DIR, max_iter=100, tol=1e-6):
+    """Held-out pseudo-R2 of GLMs for every filter size and ridge penalty.
+
+    `stim` is one covariate or a (time, covariates) array, each covariate
+    getting `filter_size` lags as in `build_design_matrix`, and `spikes`
+    one neuron or a (time, neurons) matrix. The recording is cut into
+    `n_folds` contiguous blocks, and each block is predicted by a
+    `GLMModel(alpha=...)` fitted on the others, in `n_jobs` processes.
+
+    The pool runs one task per fold and filter size: it builds that
+    training matrix once and walks the penalties, warm-starting each fit
+    from the previous one. Spreading the grid this way, not just the
+    folds, keeps all workers busy on large sweeps; only the penalties stay
+    in sequence, for the warm starts. Every fit is also saved under
+    `cache_dir`, keyed by a hash of the data and by its settings, so
+    running the sweep again, or on a larger grid, only fits what is new;
+    `cache_dir=None` turns this off.
+
+    Returns the scores averaged over folds, shape
+    (len(filter_sizes), len(alphas), neurons), without the last axis for a
+    single neuron.
+    """
+    stim = np.asarray(stim, dtype=float)
+    stim = stim.reshape(len(stim), -1)
+    spikes = np.asarray(spikes, dtype=float)
+    spikes_2d = spikes.reshape(len(spikes), -1)
+    sizes = sorted(set(int(size) for size in filter_sizes))
+    # strongest penalty first: its fit is the smoothest place to start from
+    penalties = sorted(set(float(alpha) for alpha in alphas), reverse=True)
+    bounds = np.linspace(0, len(spikes), n_folds + 1).astype(int)
+    folds = list(zip(bounds[:-1], bounds[1:]))
+    memos = [None] * n_folds
+    if cache_dir is not None:
+        key = data_hash(stim, spikes_2d)
+        memos = [os.path.join(cache_dir, 'glm_cv', key, f"{n_folds}-{k}") for k in range(n_folds)]
+        for memo in memos:
+            os.makedirs(memo, exist_ok=True)
+    tasks = [(k, size) for k in range(n_folds) for size in sizes]
+    args = (
+        [stim] * len(tasks),
+        [spikes_2d] * len(tasks),
+        [folds[k] for k, _ in tasks],
+        [size for _, size in tasks],
+        [penalties] * len(tasks),
+        [max_iter] * len(tasks),
+        [tol] * len(tasks),
+        [memos[k] for k, _ in tasks],
+    )
+    if n_jobs is None or n_jobs <= 1:
+        scores = list(map(_cross_validate_filter, *args))
+    else:
+        with ProcessPoolExecutor(n_jobs) as pool:
+            scores = list(pool.map(_cross_validate_filter, *args))
+    scores = np.mean(np.reshape(scores, (n_folds, len(sizes), len(penalties), -1)), axis=0)
+    scores = scores[np.ix_(
+        [sizes.index(int(size)) for size in filter_sizes],
+        [penalties.index(float(alpha)) for alpha in alphas],
+    )]
+    return scores if spikes.ndim == 2 else scores[..., 0]
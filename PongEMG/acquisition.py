@@ -0,0 +1,157 @@
+"""Read several SpikerBoxes at once, e.g. one per player.
+
+Each device gets its own `emg_process_loop` process, so a slow or stalled
+port never holds up the others. Every process reports, for each chunk, the
+time the chunk arrived (`time.perf_counter()`, which is the same clock in all
+processes) and how many feature rows it had published by then. From the last
+few of these reports `DeviceClock` fits the device's real sample rate and
+offset, which corrects for each device's crystal running a bit fast or slow,
+and maps any moment on the shared clock to a row of that device's features.
+
+A device whose last chunk is far behind the others' is left out of the
+alignment, so an unplugged SpikerBox does not freeze the other players.
+"""
+
+from multiprocessing import Process
+
+import numpy as np
+
+from shared_ring import SharedRing
+from spikerbox_serial import FRAME_SIZE, SAMPLE_RATE
+
+
+class DeviceClock:
+    """Maps shared-clock time to feature rows of one device.
+
+    `clock_ring` holds `(arrival time, feature rows published)` per chunk;
+    a line is fitted through the last `history` chunks.
+    """
+
+    def __init__(self, clock_ring, nominal_rate, history=64):
+        self.clock_ring = clock_ring
+        self.nominal_rate = nominal_rate
+        self.history = history
+
+    def fit(self):
+        """Return `(rate, offset)` such that row ~= offset + rate * time."""
+        stamps = self.clock_ring.latest(self.history)
+        if len(stamps) == 0:
+            return self.nominal_rate, 0.0
+        t, rows = stamps[:, 0], stamps[:, 1]
+        if len(stamps) < 2 or np.ptp(t) == 0:
+            return self.nominal_rate, rows[-1] - self.nominal_rate * t[-1]
+        rate, offset = np.polyfit(t - t[-1], rows, 1)
+        return rate, offset - rate * t[-1]
+
+    def row_at(self, t):
+        rate, offset = self.fit()
+        return offset + rate * t
+
+    @property
+    def last_arrival(self):
+        stamps = self.clock_ring.latest(1)
+        return stamps[0, 0] if len(stamps) else None
+
+
+class AcquisitionManager:
+    """Run one `emg_process_loop` per serial port and align their features.
+
+    Arguments:
+    ports: Serial ports (or "emulator" names), one per device.
+    inputBufferSize, make_features: As for `emg_process_loop`; `make_features`
+        is called once per device so every device has its own feature state.
+    ring_seconds: How much recent signal each device keeps in shared memory.
+    stale_reads: A device counts as stalled once its last chunk arrived more
+        than this many `inputBufferSize` reads after the newest one.
+    loop_kwargs: Passed on to every `emg_process_loop`.
+    """
+
+    def __init__(
+        self,
+        ports,
+        inputBufferSize,
+        make_features,
+        channels=1,
+        ring_seconds=5,
+        stale_reads=5,
+        **loop_kwargs,
+    ):
+        from stream import emg_process_loop
+
+        self.channels = channels
+        self.rate = SAMPLE_RATE // channels
+        self.stale_s = stale_reads * inputBufferSize / (FRAME_SIZE * SAMPLE_RATE)
+        self.stalled = set()
+        self.feature_rings = []
+        self.clocks = []
+        self._rings = []
+        self._procs = []
+        for port in ports:
+            feature_ring = SharedRing(ring_seconds * self.rate, width=channels)
+            clock_ring = SharedRing(1024, width=2)
+            proc = Process(
+                target=emg_process_loop,
+                args=(feature_ring, port, inputBufferSize, make_features()),
+                kwargs=dict(loop_kwargs, channels=channels, clock_ring=clock_ring),
+            )
+            self.feature_rings.append(feature_ring)
+            self.clocks.append(DeviceClock(clock_ring, self.rate))
+            self._rings += [feature_ring, clock_ring]
+            self._procs.append(proc)
+
+    def start(self):
+        for proc in self._procs:
+            proc.start()
+
+    def stop(self):
+        for proc in self._procs:
+            # a process forked after pygame.init() ignores terminate()
+            proc.kill()
+        for ring in self._rings:
+            ring.close()
+            ring.unlink()
+
+    def aligned_time(self):
+        """Latest moment for which every live device has delivered data (or None).
+
+        Devices that have not delivered anything yet are left out, and so are
+        those whose last chunk is more than `stale_s` older than the newest,
+        which are listed in `stalled`. Their windows come out short or empty
+        until they catch up.
+        """
+        arrivals = [clock.last_arrival for clock in self.clocks]
+        known = {i: t for i, t in enumerate(arrivals) if t is not None}
+        if not known:
+            return None
+        newest = max(known.values())
+        stalled = {i for i, t in known.items() if newest - t > self.stale_s}
+        for i in sorted(stalled - self.stalled):
+            print(f"Device {i} has sent nothing for {newest - known[i]:.1f} s, skipping it.")
+        for i in sorted(self.stalled - stalled):
+            print(f"Device {i} is sending again.")
+        self.stalled = stalled
+        return min(t for i, t in known.items() if i not in stalled)
+
+    def aligned_windows(self, n, t=None):
+        """Per device, a copy of the `n` feature rows ending at time `t`.
+
+        `t` defaults to `aligned_time()`, so all windows cover the same moment.
+        """
+        if t is None:
+            t = self.aligned_time()
+        windows = []
+        for ring, clock in zip(self.feature_rings, self.clocks):
+            if t is None:
+                windows.append(ring.latest(0))
+                continue
+            stop = int(round(clock.row_at(t)))
+            windows.append(ring.window(stop - n, stop))
+        return windows
+
+    def aligned_means(self, n, t=None):
+        """Mean of each device's aligned window, shape `(devices, channels)`."""
+        out = np.zeros((len(self.feature_rings), self.channels))
+        for i, window in enumerate(self.aligned_windows(n, t)):
+            if len(window):
+                out[i] = window.mean(axis=0)
+        return out
@@ -0,0 +1,215 @@
+"""Many Pong games at once, for sweeping decoder settings.
+
+`BatchPong` keeps the state of N games in NumPy arrays and advances all of
+them with one set of array operations per frame. For the "following"
+computer player it reproduces `Pong.update` step for step; the "random"
+player draws from NumPy instead of Python's `random`, so it only matches in
+distribution. With it, a recorded session can be played through thousands
+of combinations of threshold, paddle size and feature window:
+
+    python batch_pong.py --session sessions/run1 --threshold 10 20 30 40 \\
+        --paddle 100 200 --window 500 1000 2000
+"""
+
+import argparse
+import itertools
+
+import numpy as np
+
+from pong import Pong
+from simulate import frame_inputs, session_features, synthetic_features
+
+
+class BatchPong:
+    """N independent Pong games, advanced together.
+
+    Arguments:
+    n: Number of games.
+    playerPaddle: Length of player 1's paddle, one value or one per game.
+    cpuPlayStyle: "following" or "random", for all games.
+    seed: Seed for the "random" player.
+
+    Attributes:
+    p1_hits, p2_hits: How often each player returned the ball.
+    Every other attribute has the name of the `Pong` attribute it mirrors,
+    with one entry per game.
+    """
+
+    def __init__(self, n, playerPaddle=100, cpuPlayStyle="following", seed=None):
+        if cpuPlayStyle not in ("following", "random"):
+            raise ValueError(f"unsupported cpuPlayStyle {cpuPlayStyle!r}")
+        # take the constants from a real game, so the two never disagree
+        ref = Pong(headless=True)
+        self.DISPLAY_WIDTH, self.DISPLAY_HEIGHT = ref.DISPLAY_WIDTH, ref.DISPLAY_HEIGHT
+        self.PLAYER_PAD2_LENGTH = ref.PLAYER_PAD2_LENGTH
+        self.PLAYER_PAD_SPEED = ref.PLAYER_PAD_SPEED
+        self.BALL_RADIUS = ref.BALL_RADIUS
+
+        self.n = n
+        self.cpuPlayStyle = cpuPlayStyle
+        self.rng = np.random.default_rng(seed)
+        self.PLAYER_PAD_LENGTH = np.broadcast_to(np.asarray(playerPaddle, dtype=np.int64), n)
+        self.p1_score = np.zeros(n, dtype=np.int64)
+        self.p2_score = np.zeros(n, dtype=np.int64)
+        self.p1_hits = np.zeros(n, dtype=np.int64)
+        self.p2_hits = np.zeros(n, dtype=np.int64)
+        self.ball_speed_x = np.full(n, ref.ball_speed_x, dtype=np.int64)
+        self.ball_speed_y = np.full(n, ref.ball_speed_y, dtype=np.int64)
+        self.ball_x = np.full(n, ref.ball_x, dtype=np.int64)
+        self.ball_y = np.full(n, ref.ball_y, dtype=np.int64)
+        self.p1_pad_y = np.full(n, ref.p1_pad_y, dtype=np.int64)
+        self.p2_pad_y = np.full(n, ref.p2_pad_y, dtype=np.int64)
+        self.p1_move_up = np.zeros(n, dtype=bool)
+        self.p1_move_down = np.zeros(n, dtype=bool)
+        self.p2_move_up = np.zeros(n, dtype=bool)
+        self.p2_move_down = np.zeros(n, dtype=bool)
+
+    def handle_input(self, emg_val, threshold):
+        """`Pong.p1_handle_event` for all games.
+
+        `emg_val` and `threshold` broadcast to `(n,)`, or to `(n, 2)` for two
+        channels (the first moves up, the second down).
+        """
+        active = np.asarray(emg_val) > np.asarray(threshold)
+        if active.ndim == 2 and active.shape[1] > 1:
+            self.p1_move_up = active[:, 0] & ~active[:, 1]
+            self.p1_move_down = active[:, 1] & ~active[:, 0]
+        else:
+            active = np.broadcast_to(active.reshape(-1), self.n)
+            self.p1_move_up = active.copy()
+            self.p1_move_down = ~active
+
+    def following_update(self):
+        center = self.p2_pad_y + 50
+        self.p2_move_up = self.ball_y < center
+        self.p2_move_down = self.ball_y > center
+
+    def random_update(self):
+        self.p2_move_up = self.rng.random(self.n) < 0.5
+        self.p2_move_down = ~self.p2_move_up
+
+    @staticmethod
+    def _move_pad(pad_y, up, down, speed, lowest):
+        # up wins over down, and each direction is clamped, as in Pong.update
+        pad_y = np.where(up, np.maximum(pad_y - speed, 0), pad_y)
+        return np.where(~up & down, np.minimum(pad_y + speed, lowest), pad_y)
+
+    def update(self):
+        if self.cpuPlayStyle == "following":
+            self.following_update()
+        else:
+            self.random_update()
+
+        ## move player pads according to player move flags
+        self.p1_pad_y = self._move_pad(
+            self.p1_pad_y,
+            self.p1_move_up,
+            self.p1_move_down,
+            self.PLAYER_PAD_SPEED,
+            self.DISPLAY_HEIGHT - self.PLAYER_PAD_LENGTH,
+        )
+        self.p2_pad_y = self._move_pad(
+            self.p2_pad_y,
+            self.p2_move_up,
+            self.p2_move_down,
+            self.PLAYER_PAD_SPEED,
+            self.DISPLAY_HEIGHT - self.PLAYER_PAD2_LENGTH,
+        )
+
+        ## move ball
+        self.ball_x += self.ball_speed_x
+        self.ball_y += self.ball_speed_y
+
+        ## bounce off the top and bottom
+        bounce = (self.ball_y < 0) | (self.ball_y > self.DISPLAY_HEIGHT - self.BALL_RADIUS)
+        self.ball_speed_y = np.where(bounce, -self.ball_speed_y, self.ball_speed_y)
+
+        ## past a pad: return the ball or score for the other player
+        left = self.ball_x < 0
+        right = ~left & (self.ball_x > self.DISPLAY_WIDTH)
+        p1_hit = left & (self.p1_pad_y < self.ball_y) & (
+            self.ball_y < self.p1_pad_y + self.PLAYER_PAD_LENGTH
+        )
+        p2_hit = right & (self.p2_pad_y < self.ball_y) & (
+            self.ball_y < self.p2_pad_y + self.PLAYER_PAD2_LENGTH
+        )
+        p1_miss = left & ~p1_hit
+        p2_miss = right & ~p2_hit
+        self.ball_speed_x = np.where(p1_hit | p2_hit, -self.ball_speed_x, self.ball_speed_x)
+        self.p1_hits += p1_hit
+        self.p2_hits += p2_hit
+        self.p2_score += p1_miss
+        self.p1_score += p2_miss
+
+        ## restart at the center, towards the player who scored
+        restart = p1_miss | p2_miss
+        self.ball_x = np.where(restart, 400, self.ball_x)
+        self.ball_y = np.where(restart, 300, self.ball_y)
+        direction = np.where(p1_miss, 5, -5)
+        self.ball_speed_x = np.where(restart, direction, self.ball_speed_x)
+        self.ball_speed_y = np.where(restart, direction, self.ball_speed_y)
+
+    @property
+    def hit_rate(self):
+        """Fraction of the balls that reached player 1 that were returned."""
+        reached = self.p1_hits + self.p2_score
+        return np.divide(self.p1_hits, reached, out=np.full(self.n, np.nan), where=reached > 0)
+
+
+def sweep(features, sample_rate, thresholds, paddles=(100,), windows=(1000,)):
+    """Play one game per (threshold, paddle, window) combination.
+
+    All games see the same recording; the window sets how many feature rows
+    are averaged into each frame's input, as in `simulate.frame_inputs`.
+    Returns a dict of arrays with one entry per combination.
+    """
+    combos = list(itertools.product(thresholds, paddles, range(len(windows))))
+    threshold, paddle, which = (np.array(column) for column in zip(*combos))
+    # (windows, frames, channels)
+    inputs = np.stack([frame_inputs(features, sample_rate, w) for w in windows])
+    game = BatchPong(len(combos), playerPaddle=paddle)
+    if inputs.shape[2] > 1:
+        threshold = threshold[:, None]
+    for step in range(inputs.shape[1]):
+        value = inputs[which, step]
+        game.handle_input(value if inputs.shape[2] > 1 else value[:, 0], threshold)
+        game.update()
+    return {
+        "threshold": threshold.reshape(-1),
+        "paddle": paddle,
+        "window": np.asarray(windows)[which],
+        "p1_score": game.p1_score,
+        "p2_score": game.p2_score,
+        "p1_hits": game.p1_hits,
+        "hit_rate": game.hit_rate,
+    }
+
+
+def main(argv=None):
+    from stream import make_features
+
+    parser = argparse.ArgumentParser(description="Sweep Pong settings on recorded EMG.")
+    parser.add_argument("--session", help="recorded session folder (default: synthetic EMG)")
+    parser.add_argument("--seconds", type=float, default=120.0, help="length of synthetic EMG")
+    parser.add_argument("--threshold", type=float, nargs="+", default=[12.0, 24.0, 36.0])
+    parser.add_argument("--paddle", type=int, nargs="+", default=[100, 200])
+    parser.add_argument("--window", type=int, nargs="+", default=[1000])
+    parser.add_argument("--top", type=int, default=10, help="how many of the best to print")
+    args = parser.parse_args(argv)
+
+    if args.session:
+        features, rate = session_features(args.session)
+    else:
+        features, rate = synthetic_features(args.seconds, make_features)
+    results = sweep(features, rate, args.threshold, args.paddle, args.window)
+    order = np.argsort(-np.nan_to_num(results["hit_rate"], nan=-1.0))[: args.top]
+    print("threshold paddle window hit_rate p1_score p2_score")
+    for i in order:
+        print(
+            f"{results['threshold'][i]:9g} {results['paddle'][i]:6d} {results['window'][i]:6d} "
+            f"{results['hit_rate'][i]:8.3f} {results['p1_score'][i]:8d} {results['p2_score'][i]:8d}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,245 @@
+"""Benchmarks for the acquisition -> decode -> feature -> game pipeline.
+
+Runs without a SpikerBox or a screen (the games draw to SDL's dummy video
+driver, the serial port is replaced by the emulator) and writes the results
+as JSON, so runs on different commits can be compared:
+
+    python benchmark.py --output bench.json
+    python benchmark.py --quick   # shorter runs, for a smoke test
+"""
+
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+os.environ.setdefault("PYGAME_HIDE_SUPPORT_PROMPT", "1")
+
+import numpy as np
+
+from emulator import encode_frames, synthesize_emg
+from features import BandPass, Envelope, MovingAverage, Pipeline, RMS, Rectify
+from spikerbox_serial import FRAME_SIZE, SAMPLE_RATE, FrameDecoder
+
+
+class _NoClock:
+    """Replaces pygame's clock so draw() does not sleep to hold 60 fps."""
+
+    def tick(self, framerate=0):
+        return 0
+
+
+def _timeit(fn, repeat):
+    """Best wall time of `repeat` calls of `fn`, in seconds."""
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def bench_decode(seconds, repeat):
+    data = encode_frames(synthesize_emg(seconds))
+    results = {}
+    for chunk in (256, 2000, 20000):
+        chunks = [data[i:i + chunk] for i in range(0, len(data), chunk)]
+
+        def run():
+            decoder = FrameDecoder()
+            for c in chunks:
+                decoder.decode(c)
+
+        best = _timeit(run, repeat)
+        results[f"chunk_{chunk}"] = {
+            "MB_per_s": len(data) / best / 1e6,
+            "realtime_factor": len(data) / (FRAME_SIZE * SAMPLE_RATE) / best,
+        }
+    return results
+
+
+def bench_features(seconds, repeat, chunk=1000):
+    signal = synthesize_emg(seconds) - 500
+    chunks = [signal[i:i + chunk] for i in range(0, len(signal), chunk)]
+    makers = {
+        "moving_average_500": lambda: Pipeline(Rectify(), MovingAverage(500)),
+        "rms_500": lambda: RMS(500),
+        "envelope_5hz": lambda: Envelope(5, SAMPLE_RATE),
+        "bandpass_20_450": lambda: BandPass(20, 450, SAMPLE_RATE),
+    }
+    results = {}
+    for name, make in makers.items():
+
+        def run():
+            feature = make()
+            for c in chunks:
+                feature(c)
+
+        best = _timeit(run, repeat)
+        results[name] = {"ns_per_sample": best / len(signal) * 1e9}
+    return results
+
+
+def bench_calibration(seconds, chunk=2000):
+    """Threshold of `ThresholdCalibrator` on input that never changes.
+
+    The signal alternates 5 s of rest and 5 s of contraction, like the
+    calibration phases, so the threshold found during play should settle and
+    then stay put; `spread_last_half` is how far it still moves.
+    """
+    from calibration import ThresholdCalibrator
+
+    parts = []
+    for k in range(int(seconds // 10) + 1):
+        parts.append(synthesize_emg(5, burst_amplitude=0, seed=2 * k))
+        parts.append(synthesize_emg(5, burst_every=1.0, burst_length=1.0, seed=2 * k + 1))
+    feature = Pipeline(Rectify(), MovingAverage(500))(np.concatenate(parts) - 500)
+    calibrator = ThresholdCalibrator(SAMPLE_RATE, adapt_s=min(60.0, seconds / 5))
+    thresholds = []
+    for i in range(0, len(feature), chunk):
+        threshold = calibrator.update(feature[i:i + chunk])
+        if threshold is not None:
+            thresholds.append(float(threshold))
+    last_half = thresholds[len(thresholds) // 2:]
+    return {
+        "calibrated": thresholds[0],
+        "final": thresholds[-1],
+        "spread_last_half": max(last_half) - min(last_half),
+    }
+
+
+def _make_game(name):
+    if name == "pong":
+        from pong import Pong
+
+        game = Pong(cpuPlayStyle="following")
+    else:
+        from flappy import Flappy
+
+        game = Flappy()
+    game.clock = _NoClock()
+    return game
+
+
+def bench_update(steps):
+    results = {}
+    for name in ("pong", "flappy"):
+        game = _make_game(name)
+        elapsed = 0.0
+        for i in range(steps):
+            if getattr(game, "done", False):
+                game = _make_game(name)
+            # alternate short contractions and rest
+            game.handle_input(50 if i % 40 < 8 else 0, 24)
+            start = time.perf_counter()
+            game.update()
+            elapsed += time.perf_counter() - start
+        results[name] = {"steps_per_s": steps / elapsed}
+    return results
+
+
+def bench_draw(frames):
+    results = {}
+    for name in ("pong", "flappy"):
+        game = _make_game(name)
+        times = np.empty(frames)
+        for i in range(frames):
+            if getattr(game, "done", False):
+                game = _make_game(name)
+            game.handle_input(50 if i % 40 < 8 else 0, 24)
+            game.update()
+            start = time.perf_counter()
+            game.draw()
+            times[i] = time.perf_counter() - start
+        results[name] = {
+            "frame_ms_p50": float(np.percentile(times, 50) * 1e3),
+            "frame_ms_p95": float(np.percentile(times, 95) * 1e3),
+        }
+    return results
+
+
+def bench_end_to_end(seconds, inputBufferSize=20000):
+    from multiprocessing import Process
+
+    from shared_ring import SharedRing
+    from stream import emg_process_loop, make_features
+
+    feature_ring = SharedRing(10 * SAMPLE_RATE)
+    proc = Process(
+        target=emg_process_loop,
+        args=(feature_ring, "emulator@fast", inputBufferSize, make_features()),
+    )
+    try:
+        proc.start()
+        # wait for the first chunk so start-up is not counted
+        while feature_ring.seq == 0 and proc.is_alive():
+            time.sleep(0.01)
+        start_seq, start = feature_ring.seq, time.perf_counter()
+        time.sleep(seconds)
+        samples = feature_ring.seq - start_seq
+        elapsed = time.perf_counter() - start
+    finally:
+        # kill, not terminate: a child forked after pygame.init() inherits
+        # SDL's SIGTERM handler and would keep running
+        proc.kill()
+        proc.join()
+        feature_ring.close()
+        feature_ring.unlink()
+    return {
+        "samples_per_s": samples / elapsed,
+        "realtime_factor": samples / elapsed / SAMPLE_RATE,
+    }
+
+
+def _git_commit():
+    try:
+        out = subprocess.run(
+            ["git", "rev-parse", "HEAD"],
+            capture_output=True,
+            text=True,
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+        )
+    except OSError:
+        return None
+    return out.stdout.strip() or None
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--output", default=None, help="write results to this JSON file")
+    parser.add_argument("--quick", action="store_true", help="shorter runs")
+    args = parser.parse_args(argv)
+
+    seconds, repeat, steps = (2, 2, 500) if args.quick else (20, 5, 5000)
+    results = {
+        "decode": bench_decode(seconds, repeat),
+        "features": bench_features(seconds, repeat),
+        "calibration": bench_calibration(60 if args.quick else 600),
+        "update": bench_update(steps),
+        "draw": bench_draw(steps // 5),
+        "end_to_end": bench_end_to_end(1 if args.quick else 5),
+    }
+    report = {
+        "meta": {
+            "commit": _git_commit(),
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": sys.version.split()[0],
+            "numpy": np.__version__,
+            "platform": platform.platform(),
+            "quick": args.quick,
+        },
+        "results": results,
+    }
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+    print(text)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,180 @@
+"""Online threshold calibration for the EMG feature.
+
+This replaces the manual step in `spike_stream_threshold.ipynb`, where a few
+seconds are recorded and the threshold is set to mean + 1 std of the running
+mean. Here the EMG process asks the player to rest and then to contract, keeps
+streaming statistics of the feature in both phases, and publishes the
+threshold. During play it keeps following slow drifts of the electrodes.
+Nothing but the statistics is kept, however long the session runs.
+
+Inputs are feature chunks of shape `(samples,)` or `(samples, channels)`;
+statistics are kept per channel.
+"""
+
+import numpy as np
+
+
+class RunningStats:
+    """Streaming mean and variance (Welford/Chan update, one chunk at a time).
+
+    With `timescale=None` every sample counts the same. Otherwise older samples
+    are forgotten exponentially, with a time constant of `timescale` samples.
+    `mask` selects which samples of a chunk to include (per channel); time
+    passes for the forgetting either way.
+    """
+
+    def __init__(self, timescale=None):
+        self.timescale = timescale
+        self.n = 0.0
+        self.mean = 0.0
+        self._m2 = 0.0
+
+    def update(self, x, mask=None):
+        x = np.asarray(x, dtype=np.float64)
+        if len(x) == 0:
+            return
+        if mask is None:
+            n_b = len(x)
+            mean_b = x.mean(axis=0)
+            m2_b = ((x - mean_b) ** 2).sum(axis=0)
+        else:
+            n_b = mask.sum(axis=0)
+            mean_b = np.where(mask, x, 0).sum(axis=0) / np.maximum(n_b, 1)
+            m2_b = np.where(mask, (x - mean_b) ** 2, 0).sum(axis=0)
+        if self.timescale is not None:
+            # down-weight what came before, as if it were fewer samples
+            keep = np.exp(-len(x) / self.timescale)
+            self.n = self.n * keep
+            self._m2 = self._m2 * keep
+        n_a = self.n
+        n = np.maximum(n_a + n_b, 1e-12)
+        delta = mean_b - self.mean
+        self.mean = self.mean + delta * n_b / n
+        self._m2 = self._m2 + m2_b + delta**2 * n_a * n_b / n
+        self.n = n_a + n_b
+
+    @property
+    def var(self):
+        return self._m2 / np.maximum(self.n, 1e-12)
+
+    @property
+    def std(self):
+        return np.sqrt(self.var)
+
+
+class StreamingQuantiles:
+    """Quantiles from a fixed-bin histogram between `low` and `high`.
+
+    Memory is `bins` counts per channel. With `timescale` set, counts decay
+    exponentially so the quantiles follow a slowly changing signal.
+    """
+
+    def __init__(self, low=0.0, high=1024.0, bins=2048, timescale=None):
+        self.low, self.high, self.bins = low, high, bins
+        self.timescale = timescale
+        self._counts = None
+        self._shape = ()
+
+    def update(self, x, mask=None):
+        x = np.asarray(x, dtype=np.float64)
+        if len(x) == 0:
+            return
+        self._shape = x.shape[1:]
+        x2 = x.reshape(len(x), -1)
+        channels = x2.shape[1]
+        if self._counts is None:
+            self._counts = np.zeros((channels, self.bins))
+        elif self.timescale is not None:
+            self._counts *= np.exp(-len(x) / self.timescale)
+        scale = self.bins / (self.high - self.low)
+        idx = np.clip(((x2 - self.low) * scale).astype(np.intp), 0, self.bins - 1)
+        idx += np.arange(channels) * self.bins
+        weights = None if mask is None else np.reshape(mask, idx.shape).ravel()
+        counts = np.bincount(idx.ravel(), weights, minlength=channels * self.bins)
+        self._counts += counts.reshape(channels, self.bins)
+
+    def quantile(self, q):
+        """Value below which a fraction `q` of the samples lies (per channel)."""
+        if self._counts is None:
+            return np.nan
+        cdf = np.cumsum(self._counts, axis=1)
+        pos = (cdf < q * cdf[:, -1:]).sum(axis=1)
+        width = (self.high - self.low) / self.bins
+        centers = self.low + (np.minimum(pos, self.bins - 1) + 0.5) * width
+        return centers.reshape(self._shape)
+
+
+class ThresholdCalibrator:
+    """Rest / contract calibration followed by slow adaptation during play.
+
+    Feed every feature chunk to `update`, which returns the current threshold
+    (`None` until calibration is done). The threshold is halfway between the
+    95th percentile at rest and the median during contraction, so it sits in
+    the gap between the two. Without a contraction phase (`contract_s=0`) it
+    falls back to the notebook's rule, mean + `n_std` std at rest.
+
+    During play, samples below the calibrated threshold update the rest
+    quantiles and samples above the calibrated 99th percentile at rest the
+    contraction quantiles, both forgetting with a time constant of `adapt_s`
+    seconds, so the threshold follows electrode drift. The two limits only
+    move with the median at rest. Sorting the samples by the live threshold
+    instead would cut each distribution where the threshold is, and the
+    threshold would drift with its own feedback. The fallback threshold has
+    no contraction statistics to sort by, so it stays at its calibrated
+    value.
+    """
+
+    def __init__(self, sample_rate, rest_s=5.0, contract_s=5.0, adapt_s=60.0, n_std=1.0):
+        self.rest_samples = int(rest_s * sample_rate)
+        self.contract_samples = int(contract_s * sample_rate)
+        self.adapt_samples = adapt_s * sample_rate
+        self.n_std = n_std
+        self.rest = RunningStats()
+        self.rest_q = StreamingQuantiles()
+        self.contract_q = StreamingQuantiles()
+        self.phase = "rest"
+        self.threshold = None
+        self._seen = 0
+
+    def _compute_threshold(self):
+        if self.contract_samples > 0:
+            return (self.rest_q.quantile(0.95) + self.contract_q.quantile(0.5)) / 2
+        return self.rest.mean + self.n_std * self.rest.std
+
+    def _next_phase(self, phase):
+        self.phase = phase
+        self._seen = 0
+        if phase == "play":
+            self.threshold = self._compute_threshold()
+            # samples are sorted into rest and contraction by this band, which
+            # only moves with the rest median, never with the threshold itself
+            self._rest_below = self.threshold
+            self._contract_above = self.rest_q.quantile(0.99)
+            self._rest_median = self.rest_q.quantile(0.5)
+            # from now on, forget old samples slowly
+            for stats in (self.rest_q, self.contract_q):
+                stats.timescale = self.adapt_samples
+
+    def update(self, x):
+        x = np.asarray(x, dtype=np.float64)
+        if self.phase == "rest":
+            take = x[: self.rest_samples - self._seen]
+            self.rest.update(take)
+            self.rest_q.update(take)
+            self._seen += len(take)
+            x = x[len(take):]
+            if self._seen >= self.rest_samples:
+                self._next_phase("contract" if self.contract_samples > 0 else "play")
+        if self.phase == "contract":
+            take = x[: self.contract_samples - self._seen]
+            self.contract_q.update(take)
+            self._seen += len(take)
+            x = x[len(take):]
+            if self._seen >= self.contract_samples:
+                self._next_phase("play")
+        if self.phase == "play" and len(x) and self.contract_samples > 0:
+            drift = self.rest_q.quantile(0.5) - self._rest_median
+            self.rest_q.update(x, x < self._rest_below + drift)
+            self.contract_q.update(x, x > self._contract_above + drift)
+            self.threshold = self._compute_threshold()
+        return self.threshold
@@ -0,0 +1,218 @@
+"""Stand-ins for the Muscle SpikerBox, so the pipeline can run without hardware.
+
+`EmulatedSpikerBox` behaves like the parts of `serial.Serial` this project
+uses (`read`, `readinto`, `in_waiting`, `timeout`), and can be returned by
+`init_serial` in place of a real port:
+
+    init_serial("emulator")             # synthetic EMG bursts
+    init_serial("emulator", channels=2) # the same, on two alternating channels
+    init_serial("emulator:session.bin") # replay a recorded byte stream
+
+`PtySpikerBox` feeds the same bytes through a pseudo-terminal instead, so
+the unmodified pyserial code path can open it like a real device (POSIX only).
+"""
+
+import os
+import threading
+import time
+
+import numpy as np
+
+from spikerbox_serial import FRAME_SIZE, SAMPLE_RATE
+
+# the SpikerBox sends one frame per sample, 20000 bytes/s, which fits in the
+# 23040 bytes/s a 230400 baud line carries
+DEVICE_BYTE_RATE = FRAME_SIZE * SAMPLE_RATE
+
+
+def encode_frames(samples):
+    """Encode 10-bit samples into the SpikerBox frame format.
+
+    `samples` of shape `(samples, channels)` are interleaved like on the
+    multi-channel SpikerBox, with only the first byte of each frame flagged.
+    """
+    samples = np.clip(np.asarray(samples), 0, 1023).astype(np.uint16)
+    samples = samples.reshape(len(samples), -1)
+    frames = np.empty(samples.shape + (FRAME_SIZE,), dtype=np.uint8)
+    frames[:, :, 0] = samples >> 7
+    frames[:, :, 1] = samples & 0x7F
+    frames[:, 0, 0] |= 0x80
+    return frames.tobytes()
+
+
+def synthesize_emg(
+    seconds=10.0,
+    sample_rate=SAMPLE_RATE,
+    baseline=500,
+    noise=3.0,
+    burst_amplitude=120.0,
+    burst_every=2.0,
+    burst_length=0.6,
+    seed=0,
+    channels=1,
+):
+    """Samples of a resting muscle with a contraction every `burst_every` s.
+
+    Contractions are bursts of broadband noise with a smooth on/off ramp,
+    which is close enough to surface EMG for exercising the pipeline.
+    With `channels > 1` the result has shape `(samples, channels)`, and the
+    contractions of the channels take turns, evenly spread over the period.
+    """
+    rng = np.random.default_rng(seed)
+    n = int(seconds * sample_rate)
+    t = np.arange(n)[:, None] / sample_rate - np.arange(channels) * burst_every / channels
+    phase = np.mod(t, burst_every) - (burst_every - burst_length) / 2
+    active = (phase >= 0) & (phase < burst_length)
+    envelope = np.where(active, np.sin(np.pi * phase / burst_length) ** 2, 0.0)
+    signal = baseline + noise * rng.standard_normal((n, channels))
+    signal += burst_amplitude * envelope * rng.standard_normal((n, channels))
+    signal = np.round(signal)
+    return signal if channels > 1 else signal[:, 0]
+
+
+class EmulatedSpikerBox:
+    """Serial-port lookalike that serves a byte stream at a given pace.
+
+    Arguments:
+    data: The bytes to serve, in the SpikerBox frame format.
+    byte_rate: Bytes per second to release, by default the rate of the
+        real device. `None` serves everything as fast as it is read.
+    loop: Start over from the beginning once all bytes have been served.
+    timeout: Same meaning as for `serial.Serial`: `None` blocks until the
+        requested number of bytes is there, a number waits at most that long.
+    """
+
+    def __init__(self, data, byte_rate=DEVICE_BYTE_RATE, loop=True, timeout=None):
+        self._data = np.frombuffer(bytes(data), dtype=np.uint8)
+        if len(self._data) < FRAME_SIZE:
+            raise ValueError(
+                f"Need at least one {FRAME_SIZE}-byte frame to serve, got {len(self._data)} bytes"
+            )
+        self.byte_rate = byte_rate
+        self.loop = loop
+        self.timeout = timeout
+        self.is_open = True
+        self._start = time.perf_counter()
+        self._pos = 0  # total bytes served so far
+
+    @classmethod
+    def synthetic(cls, seconds=10.0, seed=0, channels=1, **kwargs):
+        # the channels share the wire, so each gets 1/channels of the sample rate
+        samples = synthesize_emg(
+            seconds, sample_rate=SAMPLE_RATE // channels, seed=seed, channels=channels
+        )
+        return cls(encode_frames(samples), **kwargs)
+
+    @classmethod
+    def replay(cls, path, **kwargs):
+        with open(path, "rb") as f:
+            return cls(f.read(), **kwargs)
+
+    def _released(self):
+        """Total bytes the device has sent by now."""
+        if self.byte_rate is None:
+            released = self._pos + len(self._data)
+        else:
+            elapsed = time.perf_counter() - self._start
+            released = int(elapsed * self.byte_rate)
+        if not self.loop:
+            released = min(released, len(self._data))
+        return released
+
+    @property
+    def in_waiting(self):
+        return max(self._released() - self._pos, 0)
+
+    def reset_input_buffer(self):
+        self._pos = max(self._pos, self._released())
+
+    def _wait_for(self, size):
+        if self.byte_rate is None or self.timeout == 0:
+            return
+        deadline = None if self.timeout is None else time.perf_counter() + self.timeout
+        while self.in_waiting < size:
+            if not self.loop and self._released() >= len(self._data):
+                return
+            missing = (size - self.in_waiting) / self.byte_rate
+            if deadline is not None:
+                missing = min(missing, deadline - time.perf_counter())
+                if missing <= 0:
+                    return
+            time.sleep(missing)
+
+    def readinto(self, b):
+        view = memoryview(b).cast("B")
+        self._wait_for(len(view))
+        n = min(len(view), self.in_waiting)
+        out = np.frombuffer(view, dtype=np.uint8)
+        start = self._pos % len(self._data)
+        done = 0
+        while done < n:
+            # copy up to the end of the recording, then wrap around
+            take = min(n - done, len(self._data) - start)
+            out[done:done + take] = self._data[start:start + take]
+            done += take
+            start = 0
+        self._pos += n
+        return n
+
+    def read(self, size=1):
+        buf = bytearray(size)
+        n = self.readinto(buf)
+        return bytes(buf[:n])
+
+    def close(self):
+        self.is_open = False
+
+
+class PtySpikerBox:
+    """Serve an `EmulatedSpikerBox` stream through a pseudo-terminal.
+
+    Open `port` with `init_serial` / `serial.Serial` like a real device.
+    """
+
+    def __init__(self, source, chunk=256):
+        import pty
+        import tty
+
+        self._source = source
+        self._source.timeout = None
+        self._chunk = chunk
+        self._master, self._slave = pty.openpty()
+        tty.setraw(self._slave)
+        self.port = os.ttyname(self._slave)
+        self._running = True
+        self._thread = threading.Thread(target=self._pump, daemon=True)
+        self._thread.start()
+
+    def _pump(self):
+        buf = bytearray(self._chunk)
+        while self._running:
+            n = self._source.readinto(buf)
+            if n == 0:
+                break
+            try:
+                os.write(self._master, buf[:n])
+            except OSError:
+                break
+
+    def close(self):
+        self._running = False
+        self._thread.join(timeout=1)
+        os.close(self._master)
+        os.close(self._slave)
+
+
+def open_emulator(spec, timeout=None, channels=1):
+    """Build an emulator from an `init_serial` port name.
+
+    "emulator" gives synthetic EMG on `channels` channels, "emulator:<path>"
+    replays a file of raw bytes. Append "@fast" to serve the bytes without
+    real-time pacing.
+    """
+    spec, _, pace = spec.partition("@")
+    byte_rate = None if pace == "fast" else DEVICE_BYTE_RATE
+    _, _, path = spec.partition(":")
+    if path:
+        return EmulatedSpikerBox.replay(path, byte_rate=byte_rate, timeout=timeout)
+    return EmulatedSpikerBox.synthetic(channels=channels, byte_rate=byte_rate, timeout=timeout)
@@ -0,0 +1,118 @@
+"""Contraction onset/offset detection at the full sample rate.
+
+The game loop looks at the EMG feature once per frame, so a contraction that
+starts and ends between two frames can be missed, and a long one has to be
+debounced by the game. `OnsetDetector` runs in the EMG process on every
+sample instead and turns the feature into discrete, timestamped events,
+which it passes to the game through a `SharedRing`. `EventReader` picks up
+every new event exactly once on the game side.
+
+Each event row is `(time, kind, channel, value)`, where `time` is on the
+shared `time.perf_counter()` clock, `kind` is `ONSET` or `OFFSET`, and
+`value` is the feature value that triggered it.
+"""
+
+import numpy as np
+
+ONSET = 1.0
+OFFSET = -1.0
+EVENT_WIDTH = 4
+
+
+class OnsetDetector:
+    """Hysteresis threshold with a refractory period.
+
+    A contraction starts when the feature rises above `on_threshold` and ends
+    when it falls below `off_threshold` (80% of `on_threshold` by default).
+    A new onset within `refractory_s` of the previous one on the same channel
+    is ignored, together with its offset, so every contraction gives exactly
+    one onset. With `on_threshold=None` nothing is reported until
+    `set_threshold` is called, e.g. while the threshold is being calibrated.
+    """
+
+    def __init__(self, on_threshold, sample_rate, off_threshold=None, refractory_s=0.2):
+        self.sample_rate = sample_rate
+        self.refractory = int(refractory_s * sample_rate)
+        self.set_threshold(on_threshold, off_threshold)
+        self._state = None  # hysteresis state per channel, True = above
+        self._active = None  # an onset was reported and not yet its offset
+        self._last_onset = None  # sample index of the last reported onset
+        self._n = 0  # samples seen so far
+
+    def set_threshold(self, on_threshold, off_threshold=None):
+        if on_threshold is None:
+            self.on_threshold = self.off_threshold = None
+            return
+        self.on_threshold = np.asarray(on_threshold, dtype=np.float64)
+        if off_threshold is None:
+            off_threshold = 0.8 * self.on_threshold
+        self.off_threshold = np.asarray(off_threshold, dtype=np.float64)
+
+    def process(self, x, t_end):
+        """Detect events in a chunk whose last sample arrived at `t_end`.
+
+        Returns an array of shape `(events, EVENT_WIDTH)`, sorted by time.
+        """
+        x = np.asarray(x, dtype=np.float64)
+        x2 = x.reshape(len(x), -1)
+        n, channels = x2.shape
+        if self._state is None:
+            self._state = np.zeros(channels, dtype=bool)
+            self._active = np.zeros(channels, dtype=bool)
+            self._last_onset = np.full(channels, -self.refractory - 1)
+        if n == 0 or self.on_threshold is None:
+            self._n += n
+            return np.zeros((0, EVENT_WIDTH))
+
+        # hysteresis for all samples at once: the state is the one set by the
+        # last sample that was clearly above or below, or the previous state
+        above = x2 > self.on_threshold.reshape(-1)
+        decided = above | (x2 < self.off_threshold.reshape(-1))
+        last = np.where(decided, np.arange(n)[:, None], -1)
+        np.maximum.accumulate(last, axis=0, out=last)
+        state = np.where(
+            last >= 0,
+            np.take_along_axis(above, np.maximum(last, 0), axis=0),
+            self._state,
+        )
+        previous = np.vstack((self._state, state[:-1]))
+        rows, cols = np.nonzero(state != previous)
+        self._state = state[-1].copy()
+
+        # few transitions per chunk: apply the refractory period one by one
+        events = []
+        for i, c in zip(rows, cols):
+            index = self._n + i
+            if state[i, c]:
+                if self._active[c] or index - self._last_onset[c] < self.refractory:
+                    continue
+                self._active[c] = True
+                self._last_onset[c] = index
+                kind = ONSET
+            else:
+                if not self._active[c]:
+                    continue
+                self._active[c] = False
+                kind = OFFSET
+            t = t_end - (n - 1 - i) / self.sample_rate
+            events.append((t, kind, c, x2[i, c]))
+        self._n += n
+        return np.array(events, dtype=np.float64).reshape(-1, EVENT_WIDTH)
+
+
+class EventReader:
+    """Hands out every event written to an event ring exactly once.
+
+    If the reader falls more than the ring's capacity behind, the oldest
+    unread events are lost; everything else is kept in order.
+    """
+
+    def __init__(self, ring):
+        self.ring = ring
+        self._seq = ring.seq
+
+    def poll(self):
+        seq = self.ring.seq
+        events = self.ring.window(self._seq, seq)
+        self._seq = seq
+        return events
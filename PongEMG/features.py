@@ -0,0 +1,172 @@
+"""Streaming features for the EMG signal.
+
+Each feature keeps whatever it needs from earlier chunks, so feeding a signal
+in chunks of any size gives the same output as feeding it all at once, and
+the output has one value per input sample. Work within a chunk is vectorized
+and costs O(1) per sample.
+
+Features can be used directly as the `compute_fn` of `emg_process_loop` and
+chained with `Pipeline`, e.g.
+
+    Pipeline(BandPass(20, 450, SAMPLE_RATE), Rectify(), MovingAverage(500))
+
+Inputs are arrays of shape `(samples,)` or `(samples, channels)`.
+"""
+
+from abc import ABC, abstractmethod
+
+import numpy as np
+from scipy import signal
+
+
+class Feature(ABC):
+    """Base class: subclasses implement `process` and `reset`."""
+
+    @abstractmethod
+    def process(self, x):
+        pass
+
+    def reset(self):
+        pass
+
+    def __call__(self, x):
+        return self.process(x)
+
+
+class Pipeline(Feature):
+    """Run several features one after the other."""
+
+    def __init__(self, *stages):
+        self.stages = list(stages)
+
+    def process(self, x):
+        for stage in self.stages:
+            x = stage.process(x)
+        return x
+
+    def reset(self):
+        for stage in self.stages:
+            stage.reset()
+
+
+class Rectify(Feature):
+    """Absolute value around `center` (the SpikerBox baseline is ~500)."""
+
+    def __init__(self, center=0.0):
+        self.center = center
+
+    def process(self, x):
+        return np.abs(np.asarray(x, dtype=np.float64) - self.center)
+
+
+class MovingAverage(Feature):
+    """Mean over the last `window_size` samples, continued across chunks.
+
+    Streaming replacement for `running_mean`: instead of starting over on
+    every chunk it keeps the last `window_size` samples and a running sum.
+    Samples before the first chunk count as zeros.
+    """
+
+    def __init__(self, window_size):
+        self.window_size = int(window_size)
+        self.reset()
+
+    def reset(self):
+        self._history = None  # ring of the last window_size samples
+        self._pos = 0  # oldest sample in the ring
+        self._sum = 0.0
+
+    def process(self, x):
+        x = np.asarray(x, dtype=np.float64)
+        n, w = len(x), self.window_size
+        if self._history is None:
+            self._history = np.zeros((w,) + x.shape[1:])
+            self._sum = np.zeros(x.shape[1:])
+        if n == 0:
+            return x.copy()
+
+        # the sample that leaves the window as each new one comes in
+        if n >= w:
+            oldest_first = np.roll(self._history, -self._pos, axis=0)
+            leaving = np.concatenate((oldest_first, x[: n - w]))
+        else:
+            idx = (self._pos + np.arange(n)) % w
+            leaving = self._history[idx]
+        out = np.cumsum(x - leaving, axis=0)
+        out += self._sum
+
+        if n >= w:
+            self._history[:] = x[n - w:]
+            self._pos = 0
+        else:
+            self._history[idx] = x
+            self._pos = (self._pos + n) % w
+        if n >= w or self._pos < n:
+            # resync the running sum every time the ring wraps
+            self._sum = self._history.sum(axis=0)
+        else:
+            self._sum = out[-1].copy()
+
+        out /= w
+        return out
+
+
+class RMS(Feature):
+    """Root mean square over the last `window_size` samples."""
+
+    def __init__(self, window_size):
+        self._mean = MovingAverage(window_size)
+
+    def reset(self):
+        self._mean.reset()
+
+    def process(self, x):
+        x = np.asarray(x, dtype=np.float64)
+        power = self._mean.process(x * x)
+        return np.sqrt(np.maximum(power, 0, out=power), out=power)
+
+
+class SOSFilter(Feature):
+    """IIR filter in second-order sections, keeping the filter state between chunks."""
+
+    def __init__(self, sos):
+        self.sos = np.asarray(sos)
+        self.reset()
+
+    def reset(self):
+        self._zi = None
+
+    def process(self, x):
+        x = np.asarray(x, dtype=np.float64)
+        if len(x) == 0:
+            return x.copy()
+        if self._zi is None:
+            # start from rest at the level of the first sample
+            zi = signal.sosfilt_zi(self.sos)
+            zi = zi.reshape(zi.shape + (1,) * (x.ndim - 1))
+            self._zi = zi * x[0]
+        out, self._zi = signal.sosfilt(self.sos, x, axis=0, zi=self._zi)
+        return out
+
+
+class BandPass(SOSFilter):
+    """Butterworth band-pass between `low` and `high` Hz."""
+
+    def __init__(self, low, high, fs, order=4):
+        sos = signal.butter(order, [low, high], btype="bandpass", fs=fs, output="sos")
+        super().__init__(sos)
+
+
+class LowPass(SOSFilter):
+    """Butterworth low-pass with cutoff `cutoff` Hz."""
+
+    def __init__(self, cutoff, fs, order=2):
+        sos = signal.butter(order, cutoff, btype="lowpass", fs=fs, output="sos")
+        super().__init__(sos)
+
+
+class Envelope(Pipeline):
+    """Rectified and low-pass filtered signal, a smooth measure of activation."""
+
+    def __init__(self, cutoff, fs, order=2, center=0.0):
+        super().__init__(Rectify(center), LowPass(cutoff, fs, order))
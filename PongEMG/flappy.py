@@ -10,11 +10,15 @@ Modifications include: class structure for modular use, EMG decoding input, and
 """
 
 import os
+import time
 import pygame
 from collections import deque
-from random import randint
+from random import Random, randint
 from pygame.locals import *
 import math
+import numpy as np
+
+from render import CachedText, DirtyRenderer
 
 WIN_WIDTH = 284 * 2
 WIN_HEIGHT = 512
@@ -36,11 +40,13 @@ class Bird(pygame.sprite.Sprite):
         super().__init__()
         self.x, self.y = x, y
         self.msec_to_climb = msec_to_climb
+        self.msec = 0.0  # game time, so the wings flap the same without a clock
         self._img_wingup, self._img_wingdown = images
         self._mask_wingup = pygame.mask.from_surface(self._img_wingup)
         self._mask_wingdown = pygame.mask.from_surface(self._img_wingdown)
 
     def update(self, delta_frames=1):
+        self.msec += frames_to_msec(delta_frames)
         if self.msec_to_climb > 0:
             frac = 1 - self.msec_to_climb / Bird.CLIMB_DURATION
             self.y -= (
@@ -56,7 +62,7 @@ class Bird(pygame.sprite.Sprite):
     def image(self):
         return (
             self._img_wingup
-            if pygame.time.get_ticks() % 500 >= 250
+            if self.msec % 500 >= 250
             else self._img_wingdown
         )
 
@@ -64,7 +70,7 @@ class Bird(pygame.sprite.Sprite):
     def mask(self):
         return (
             self._mask_wingup
-            if pygame.time.get_ticks() % 500 >= 250
+            if self.msec % 500 >= 250
             else self._mask_wingdown
         )
 
@@ -84,10 +90,11 @@ class PipePair(pygame.sprite.Sprite):
         smoother.  Note that there is no y attribute, as it will only
         ever be 0.
     image: A pygame.Surface which can be blitted to the display surface
-        to display the PipePair.
+        to display the PipePair.  It is shared by all PipePairs with the
+        same layout, so it must not be drawn on.
     mask: A bitmask which excludes all pixels in self.image with a
         transparency greater than 127.  This can be used for collision
-        detection.
+        detection.  Shared like self.image.
     top_pieces: The number of pieces, including the end piece, in the
         top pipe.
     bottom_pieces: The number of pieces, including the end piece, in
@@ -106,7 +113,10 @@ class PipePair(pygame.sprite.Sprite):
     PIECE_HEIGHT = 32
     ADD_INTERVAL = 3000
 
-    def __init__(self, pipe_end_img, pipe_body_img):
+    _assets = {}  # bottom pieces -> (image, mask), for _asset_images
+    _asset_images = None
+
+    def __init__(self, pipe_end_img, pipe_body_img, rng=None):
         """Initialises a new random PipePair.
 
         The new PipePair will automatically be assigned an x attribute of
@@ -116,14 +126,28 @@ class PipePair(pygame.sprite.Sprite):
         pipe_end_img: The image to use to represent a pipe's end piece.
         pipe_body_img: The image to use to represent one horizontal slice
             of a pipe's body.
+        rng: The random.Random to draw the layout from, for reproducible
+            games.  By default the random module's is used.
         """
         self.x = float(WIN_WIDTH - 1)
         self.score_counted = False
 
-        self.image = pygame.Surface((PipePair.WIDTH, WIN_HEIGHT), SRCALPHA)
-        self.image.convert()  # speeds up blitting
-        self.image.fill((0, 0, 0, 0))
-        total_pipe_body_pieces = int(
+        pick = rng.randint if rng is not None else randint
+        self.bottom_pieces = pick(1, PipePair.body_pieces())
+        self.top_pieces = PipePair.body_pieces() - self.bottom_pieces
+        # image and mask are shared by all pipes with this layout
+        self.image, self.mask = PipePair.assets(
+            self.bottom_pieces, pipe_end_img, pipe_body_img
+        )
+
+        # compensate for added end pieces
+        self.top_pieces += 1
+        self.bottom_pieces += 1
+
+    @staticmethod
+    def body_pieces():
+        """Get the number of body pieces shared by the top and bottom pipe."""
+        return int(
             (
                 WIN_HEIGHT  # fill window from top to bottom
                 - 6 * Bird.HEIGHT  # make room for bird to fit through
@@ -131,29 +155,52 @@ class PipePair(pygame.sprite.Sprite):
             )  # 2 end pieces + 1 body piece
             / PipePair.PIECE_HEIGHT  # to get number of pipe pieces
         )
-        self.bottom_pieces = randint(1, total_pipe_body_pieces)
-        self.top_pieces = total_pipe_body_pieces - self.bottom_pieces
-
-        # bottom pipe
-        for i in range(1, self.bottom_pieces + 1):
-            piece_pos = (0, WIN_HEIGHT - i * PipePair.PIECE_HEIGHT)
-            self.image.blit(pipe_body_img, piece_pos)
-        bottom_pipe_end_y = WIN_HEIGHT - self.bottom_height_px
-        bottom_end_piece_pos = (0, bottom_pipe_end_y - PipePair.PIECE_HEIGHT)
-        self.image.blit(pipe_end_img, bottom_end_piece_pos)
-
-        # top pipe
-        for i in range(self.top_pieces):
-            self.image.blit(pipe_body_img, (0, (i * PipePair.PIECE_HEIGHT)))
-        top_pipe_end_y = self.top_height_px
-        self.image.blit(pipe_end_img, (0, top_pipe_end_y))
 
-        # compensate for added end pieces
-        self.top_pieces += 1
-        self.bottom_pieces += 1
+    @classmethod
+    def assets(cls, bottom_pieces, pipe_end_img, pipe_body_img):
+        """Get the image and collision mask of one pipe layout.
 
-        # for collision detection
-        self.mask = pygame.mask.from_surface(self.image)
+        There are only `body_pieces()` different layouts, so each one is
+        drawn once and then shared, instead of being drawn again for every
+        new PipePair.
+
+        Arguments:
+        bottom_pieces: The number of body pieces in the bottom pipe, not
+            counting its end piece.
+        pipe_end_img, pipe_body_img: As for __init__.
+        """
+        if cls._asset_images != (pipe_end_img, pipe_body_img):
+            # new images (e.g. a new game loaded them again): start over
+            cls._assets = {}
+            cls._asset_images = pipe_end_img, pipe_body_img
+        if bottom_pieces not in cls._assets:
+            top_pieces = cls.body_pieces() - bottom_pieces
+            image = pygame.Surface((PipePair.WIDTH, WIN_HEIGHT), SRCALPHA)
+            image.fill((0, 0, 0, 0))
+
+            # bottom pipe
+            for i in range(1, bottom_pieces + 1):
+                piece_pos = (0, WIN_HEIGHT - i * PipePair.PIECE_HEIGHT)
+                image.blit(pipe_body_img, piece_pos)
+            bottom_pipe_end_y = WIN_HEIGHT - bottom_pieces * PipePair.PIECE_HEIGHT
+            bottom_end_piece_pos = (0, bottom_pipe_end_y - PipePair.PIECE_HEIGHT)
+            image.blit(pipe_end_img, bottom_end_piece_pos)
+
+            # top pipe
+            for i in range(top_pieces):
+                image.blit(pipe_body_img, (0, (i * PipePair.PIECE_HEIGHT)))
+            top_pipe_end_y = top_pieces * PipePair.PIECE_HEIGHT
+            image.blit(pipe_end_img, (0, top_pipe_end_y))
+
+            # for collision detection
+            cls._assets[bottom_pieces] = image, pygame.mask.from_surface(image)
+        return cls._assets[bottom_pieces]
+
+    @classmethod
+    def preload(cls, pipe_end_img, pipe_body_img):
+        """Draw every pipe layout now, so spawning a pipe never has to."""
+        for bottom_pieces in range(1, cls.body_pieces() + 1):
+            cls.assets(bottom_pieces, pipe_end_img, pipe_body_img)
 
     @property
     def top_height_px(self):
@@ -173,7 +220,7 @@ class PipePair(pygame.sprite.Sprite):
     @property
     def rect(self):
         """Get the Rect which contains this PipePair."""
-        return Rect(self.x, 0, PipePair.WIDTH, PipePair.PIECE_HEIGHT)
+        return Rect(self.x, 0, PipePair.WIDTH, WIN_HEIGHT)
 
     def update(self, delta_frames=1):
         """Update the PipePair's position.
@@ -187,22 +234,39 @@ class PipePair(pygame.sprite.Sprite):
     def collides_with(self, bird):
         """Get whether the bird collides with a pipe in this PipePair.
 
+        The cheap tests come first: a bird beside this PipePair, or wholly
+        inside the gap between its pipes, cannot touch them.  Only a bird
+        whose rect overlaps a pipe is tested pixel by pixel.
+
         Arguments:
         bird: The Bird which should be tested for collision with this
             PipePair.
         """
-        return pygame.sprite.collide_mask(self, bird)
+        pipe_rect, bird_rect = self.rect, bird.rect
+        if bird_rect.right <= pipe_rect.left or bird_rect.left >= pipe_rect.right:
+            return False
+        # the pipes have no pixels between top_height_px and the bottom pipe
+        gap_bottom = WIN_HEIGHT - self.bottom_height_px
+        if self.top_height_px <= bird_rect.top and bird_rect.bottom <= gap_bottom:
+            return False
+        return pygame.sprite.collide_mask(self, bird) is not None
 
 
 class Flappy:
-    def __init__(self):
-        pygame.init()
+    def __init__(self, headless=False, seed=None):
+        # headless: no window and no clock, update() only advances the game by
+        # one frame, so recorded EMG can be played back fast (see simulate.py)
+        self.headless = headless
         self.DISPLAY_SIZE = WIN_WIDTH, WIN_HEIGHT
-        self.screen = pygame.display.set_mode(self.DISPLAY_SIZE)
-        pygame.display.set_caption("Flappy EMG Bird")
+        if not headless:
+            pygame.init()
+            self.screen = pygame.display.set_mode(self.DISPLAY_SIZE)
+            pygame.display.set_caption("Flappy EMG Bird")
+            self.clock = pygame.time.Clock()
 
-        self.clock = pygame.time.Clock()
+        self.rng = Random(seed)
         self.images = self.load_images()
+        PipePair.preload(self.images["pipe-end"], self.images["pipe-body"])
         self.bird = Bird(
             50,
             WIN_HEIGHT // 2,
@@ -213,12 +277,21 @@ class Flappy:
         self.frame_clock = 0
         self.score = 0
         self.done = False
-        self.score_font = pygame.font.SysFont(None, 32, bold=True)
+        if not headless:
+            self.score_font = pygame.font.SysFont(None, 32, bold=True)
+            self.score_text = CachedText(self.score_font, (255, 255, 255))
+            # the background image, tiled across the window, is drawn only once
+            background = pygame.Surface(self.DISPLAY_SIZE)
+            for x in (0, WIN_WIDTH // 2):
+                background.blit(self.images["background"], (x, 0))
+            self.renderer = DirtyRenderer(self.screen, background)
 
     def load_images(self):
         def load(name):
             path = os.path.join(os.path.dirname(__file__), "images", name)
-            return pygame.image.load(path).convert_alpha()
+            image = pygame.image.load(path)
+            # converting needs a window; masks only need the alpha channel
+            return image if self.headless else image.convert_alpha()
 
         return {
             "background": load("background.png"),
@@ -229,7 +302,18 @@ class Flappy:
         }
 
     def handle_input(self, emg_value, threshold):
-        if emg_value > threshold and self.bird.msec_to_climb <= 0:
+        # emg_value can also hold one value per EMG channel: any of them flaps
+        if np.any(np.asarray(emg_value) > threshold) and self.bird.msec_to_climb <= 0:
+            self.bird.msec_to_climb = Bird.CLIMB_DURATION
+
+    def handle_window_event(self, event):
+        # repaint everything after the window was exposed or restored
+        if not self.headless:
+            self.renderer.handle_event(event)
+
+    def handle_emg_event(self, kind, channel):
+        # every contraction onset (from events.py) is exactly one flap
+        if kind > 0:
             self.bird.msec_to_climb = Bird.CLIMB_DURATION
 
     def update(self):
@@ -238,7 +322,7 @@ class Flappy:
 
         if self.frame_clock % (PipePair.ADD_INTERVAL * FPS // 1000) == 0:
             self.pipes.append(
-                PipePair(self.images["pipe-end"], self.images["pipe-body"])
+                PipePair(self.images["pipe-end"], self.images["pipe-body"], self.rng)
             )
 
         pipe_collision = any(p.collides_with(self.bird) for p in self.pipes)
@@ -260,17 +344,19 @@ class Flappy:
         self.frame_clock += 1
 
     def draw(self):
-        for x in (0, WIN_WIDTH // 2):
-            self.screen.blit(self.images["background"], (x, 0))
+        if self.headless:
+            return
+        self.renderer.clear()
 
         for pipe in self.pipes:
-            self.screen.blit(pipe.image, pipe.rect)
+            self.renderer.blit(pipe.image, pipe.rect)
 
-        self.screen.blit(self.bird.image, self.bird.rect)
+        self.renderer.blit(self.bird.image, self.bird.rect)
 
-        score_surf = self.score_font.render(str(self.score), True, (255, 255, 255))
+        score_surf = self.score_text.render(self.score)
         score_x = WIN_WIDTH // 2 - score_surf.get_width() // 2
-        self.screen.blit(score_surf, (score_x, PipePair.PIECE_HEIGHT))
+        self.renderer.blit(score_surf, (score_x, PipePair.PIECE_HEIGHT))
 
-        pygame.display.flip()
+        self.renderer.present()
+        self.flip_time = time.perf_counter()
         self.clock.tick(FPS)
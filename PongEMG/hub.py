@@ -0,0 +1,323 @@
+"""Share one SpikerBox between several programs.
+
+Only one process can open the serial port. The hub owns it, decodes the
+stream and computes the features once, and publishes everything to local
+subscribers (the game, the live scope, a logger, ...) over a localhost TCP
+or Unix socket:
+
+    python hub.py --port COM3 --listen 127.0.0.1:8765
+
+A program that expects a serial port can use the hub instead, by passing
+"hub:127.0.0.1:8765" (or "hub:/path/to/socket") as `cport`; it then gets the
+raw bytes, exactly as if it read the device itself. Other programs can use
+`HubClient` to receive decoded samples or features directly.
+
+Every subscriber has its own bounded queue. When a subscriber is too slow
+to keep up, its oldest frames are dropped; the acquisition and the other
+subscribers never wait for it. If the device cannot be opened or read, the
+hub closes every connection, so clients get a `ConnectionError`, and
+`Hub.run` raises the error.
+
+Wire format: each frame is a 24-byte header followed by the payload,
+
+    magic b"EMGH", kind (u8), width (u8), reserved (u16),
+    seq (u32), time (f64, perf_counter of the hub), payload bytes (u32)
+
+`kind` is `RAW` (uint8 bytes from the device), `SAMPLES` or `FEATURES`
+(float32, `width` values per row). On connecting, a subscriber sends one
+byte with bit `kind` set for every kind it wants.
+"""
+
+import argparse
+import asyncio
+import select
+import socket
+import struct
+import threading
+
+import numpy as np
+
+from features import MovingAverage, Pipeline, Rectify
+from latency import now
+from spikerbox_serial import (
+    ByteRing,
+    FrameDecoder,
+    init_serial,
+    read_arduino_into,
+)
+
+RAW, SAMPLES, FEATURES = 0, 1, 2
+HEADER = struct.Struct("<4sBBHIdI")
+MAGIC = b"EMGH"
+_DTYPES = {RAW: np.uint8, SAMPLES: np.float32, FEATURES: np.float32}
+
+
+def encode_frame(kind, seq, t, array, width=1):
+    payload = np.ascontiguousarray(array, dtype=_DTYPES[kind])
+    header = HEADER.pack(MAGIC, kind, width, 0, seq & 0xFFFFFFFF, t, payload.nbytes)
+    return header + payload.tobytes()
+
+
+def parse_address(address):
+    """'host:port' for TCP, anything else is a Unix socket path."""
+    host, sep, port = address.rpartition(":")
+    if sep and port.isdigit() and "/" not in address:
+        return socket.AF_INET, (host, int(port))
+    return socket.AF_UNIX, address
+
+
+class _Subscriber:
+    def __init__(self, kinds, queue_size):
+        self.kinds = kinds
+        self.queue = asyncio.Queue(queue_size)
+        self.dropped = 0
+
+    def close(self):
+        # None tells the connection handler to hang up, even on a full queue
+        self.offer(None)
+
+    def offer(self, frame):
+        if self.queue.full():
+            # drop the oldest frame rather than wait for a slow reader
+            self.queue.get_nowait()
+            self.dropped += 1
+        self.queue.put_nowait(frame)
+
+
+class Hub:
+    """Reads one SpikerBox and serves its data to any number of subscribers."""
+
+    def __init__(
+        self,
+        cport,
+        address,
+        inputBufferSize=400,
+        channels=1,
+        make_features=None,
+        queue_size=256,
+    ):
+        self.cport = cport
+        self.address = address
+        self.inputBufferSize = inputBufferSize
+        self.channels = channels
+        self.features = (make_features or _default_features)()
+        self.queue_size = queue_size
+        self._subscribers = set()
+        self._running = False
+        self.error = None
+
+    def run(self):
+        asyncio.run(self.serve())
+
+    async def serve(self):
+        self._loop = asyncio.get_running_loop()
+        family, addr = parse_address(self.address)
+        if family == socket.AF_UNIX:
+            server = await asyncio.start_unix_server(self._handle, addr)
+        else:
+            server = await asyncio.start_server(self._handle, *addr)
+        self._running = True
+        self._failed = self._loop.create_future()
+        reader = threading.Thread(target=self._acquire, daemon=True)
+        reader.start()
+        try:
+            async with server:
+                await server.start_serving()
+                # only returns by raising the acquisition thread's error
+                await self._failed
+        finally:
+            self._running = False
+
+    async def _handle(self, reader, writer):
+        try:
+            mask = (await reader.readexactly(1))[0]
+        except asyncio.IncompleteReadError:
+            writer.close()
+            return
+        if self.error is not None:
+            writer.close()
+            return
+        kinds = {k for k in (RAW, SAMPLES, FEATURES) if mask & (1 << k)}
+        sub = _Subscriber(kinds, self.queue_size)
+        self._subscribers.add(sub)
+        try:
+            while True:
+                frame = await sub.queue.get()
+                if frame is None:
+                    break
+                writer.write(frame)
+                await writer.drain()
+        except (ConnectionError, OSError):
+            pass
+        finally:
+            self._subscribers.discard(sub)
+            writer.close()
+
+    def _publish(self, frames):
+        for sub in self._subscribers:
+            for kind, frame in frames:
+                if kind in sub.kinds:
+                    sub.offer(frame)
+
+    async def _shutdown(self, error):
+        self.error = error
+        for sub in self._subscribers:
+            sub.close()
+        # let the handlers send what is queued and hang up, but not forever
+        for _ in range(100):
+            if not self._subscribers:
+                break
+            await asyncio.sleep(0.01)
+        self._failed.set_exception(error)
+
+    def _acquire(self):
+        try:
+            self._read_device()
+        except Exception as error:
+            print(f"Hub: reading {self.cport} failed: {error!r}")
+            self._loop.call_soon_threadsafe(self._loop.create_task, self._shutdown(error))
+
+    def _read_device(self):
+        # runs in its own thread, so a blocking read never stalls the sockets
+        ser = init_serial(self.cport)
+        ring = ByteRing(4 * self.inputBufferSize)
+        decoder = FrameDecoder(self.channels)
+        seq = 0
+        while self._running:
+            data = read_arduino_into(ser, ring, self.inputBufferSize)
+            t = now()
+            frames = [(RAW, encode_frame(RAW, seq, t, data))]
+            samples = decoder.decode(data)
+            if len(samples):
+                signal = np.subtract(samples, 500, out=samples)
+                feature = self.features(signal)
+                frames.append((SAMPLES, encode_frame(SAMPLES, seq, t, signal, self.channels)))
+                frames.append((FEATURES, encode_frame(FEATURES, seq, t, feature, self.channels)))
+            self._loop.call_soon_threadsafe(self._publish, frames)
+            seq += 1
+
+
+def _default_features():
+    return Pipeline(Rectify(), MovingAverage(window_size=500))
+
+
+class HubClient:
+    """Blocking client that receives frames of the given kinds from a hub."""
+
+    def __init__(self, address, kinds=(FEATURES,)):
+        family, addr = parse_address(address)
+        self.sock = socket.socket(family, socket.SOCK_STREAM)
+        self.sock.connect(addr)
+        self.sock.sendall(bytes([sum(1 << k for k in kinds)]))
+        self._rx = bytearray()
+
+    def _fill(self, timeout):
+        """Receive whatever arrives within `timeout` seconds (None = wait)."""
+        ready, _, _ = select.select([self.sock], [], [], timeout)
+        if not ready:
+            return False
+        chunk = self.sock.recv(1 << 16)
+        if not chunk:
+            raise ConnectionError("hub closed the connection")
+        self._rx += chunk
+        return True
+
+    def _next_frame(self):
+        """Pop one complete frame from the receive buffer, or None."""
+        if len(self._rx) < HEADER.size:
+            return None
+        magic, kind, width, _, seq, t, nbytes = HEADER.unpack_from(self._rx)
+        if magic != MAGIC:
+            raise ValueError("lost sync with the hub stream")
+        end = HEADER.size + nbytes
+        if len(self._rx) < end:
+            return None
+        array = np.frombuffer(bytes(self._rx[HEADER.size:end]), dtype=_DTYPES[kind])
+        del self._rx[:end]
+        if kind != RAW:
+            array = array.reshape(-1, width)
+        return kind, seq, t, array
+
+    def recv(self):
+        """Wait for the next frame and return `(kind, seq, time, array)`."""
+        frame = self._next_frame()
+        while frame is None:
+            self._fill(None)
+            frame = self._next_frame()
+        return frame
+
+    def close(self):
+        self.sock.close()
+
+
+class HubSerial(HubClient):
+    """The hub's raw byte stream behind the serial-port calls this project uses."""
+
+    def __init__(self, address, timeout=None):
+        super().__init__(address, kinds=(RAW,))
+        self.timeout = timeout
+        self._data = bytearray()
+
+    def _pump(self, timeout):
+        try:
+            if self._fill(timeout):
+                # take everything else that is already there, too
+                while self._fill(0):
+                    pass
+        finally:
+            frame = self._next_frame()
+            while frame is not None:
+                self._data += memoryview(frame[3])
+                frame = self._next_frame()
+
+    @property
+    def in_waiting(self):
+        try:
+            self._pump(0)
+        except ConnectionError:
+            if not self._data:
+                raise
+        return len(self._data)
+
+    def readinto(self, b):
+        """Read like pyserial; raises `ConnectionError` once the hub is gone
+        and everything it sent has been read."""
+        view = memoryview(b).cast("B")
+        deadline = None if self.timeout is None else now() + self.timeout
+        while len(self._data) < len(view):
+            remaining = None if deadline is None else deadline - now()
+            if remaining is not None and remaining <= 0:
+                break
+            try:
+                self._pump(remaining)
+            except ConnectionError:
+                if not self._data:
+                    raise
+                break
+        n = min(len(view), len(self._data))
+        view[:n] = self._data[:n]
+        del self._data[:n]
+        return n
+
+    def read(self, size=1):
+        buf = bytearray(size)
+        n = self.readinto(buf)
+        return bytes(buf[:n])
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Share one SpikerBox between programs.")
+    parser.add_argument("--port", default="COM3", help="serial port, or 'emulator'")
+    parser.add_argument("--listen", default="127.0.0.1:8765", help="host:port or socket path")
+    parser.add_argument("--channels", type=int, default=1)
+    parser.add_argument(
+        "--read-size", type=int, default=400, help="bytes per read (default: 10 ms of data)"
+    )
+    args = parser.parse_args(argv)
+    hub = Hub(args.port, args.listen, args.read_size, args.channels)
+    print(f"Serving {args.port} on {args.listen}")
+    hub.run()
+
+
+if __name__ == "__main__":
+    main()
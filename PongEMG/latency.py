@@ -0,0 +1,80 @@
+"""Timestamps for every stage between the SpikerBox and the screen.
+
+The EMG process stamps each chunk when its bytes come back from the serial
+port, when they are decoded, when the feature is computed and when it is
+published. When the first byte of the chunk reached the port cannot be
+measured (the read only returns at the end), so it is estimated from the
+chunk length at the wire rate; bytes that waited in the OS buffer make the
+estimate late. Every number relative to it is labelled "_est". The EMG
+process writes those stamps into a small `SharedRing`. The game process
+adds the moment it consumes that chunk and the moment the next frame is
+flipped, and collects full rows in a `LatencyRecorder`.
+
+All stamps come from `time.perf_counter()`, which uses a system-wide clock on
+Linux, Windows and macOS, so stamps from both processes can be compared.
+"""
+
+import time
+
+import numpy as np
+
+# stages stamped by the EMG process, in order
+EMG_STAGES = ("first_byte_est", "arrived", "decoded", "computed", "published")
+# stages stamped by the game process
+GAME_STAGES = ("consumed", "flipped")
+STAGES = EMG_STAGES + GAME_STAGES
+
+now = time.perf_counter
+
+
+class LatencyRecorder:
+    """Fixed-size store of per-chunk stage timestamps.
+
+    Each row holds one timestamp per entry of `STAGES`. Once `capacity` rows
+    are recorded, the oldest ones are overwritten.
+    """
+
+    def __init__(self, capacity=100000):
+        self._rows = np.full((capacity, len(STAGES)), np.nan)
+        self._n = 0
+
+    def record(self, emg_stamps, consumed, flipped):
+        row = self._rows[self._n % len(self._rows)]
+        row[: len(EMG_STAGES)] = emg_stamps
+        row[len(EMG_STAGES):] = consumed, flipped
+        self._n += 1
+
+    @property
+    def rows(self):
+        return self._rows[: min(self._n, len(self._rows))]
+
+    def summary(self, percentiles=(50, 95, 99)):
+        """Latency percentiles in ms, both per stage and since the first byte.
+
+        Returns a dict mapping `"<stage>"` (time since the previous stage) and
+        `"total_<stage>_est"` (time since the estimated arrival of the first
+        byte of the chunk) to a dict of `{"p50": ..., "p95": ..., "p99": ...}`.
+        The first stage, `"arrived_est"`, is itself estimated.
+        """
+        rows = self.rows * 1000.0
+        out = {}
+        if len(rows) == 0:
+            return out
+        steps = np.diff(rows, axis=1)
+        totals = rows[:, 1:] - rows[:, :1]
+        for i, stage in enumerate(STAGES[1:]):
+            step = stage + "_est" if i == 0 else stage
+            for key, values in ((step, steps[:, i]), (f"total_{stage}_est", totals[:, i])):
+                q = np.nanpercentile(values, percentiles)
+                out[key] = {f"p{p}": float(v) for p, v in zip(percentiles, q)}
+        return out
+
+    def print_summary(self):
+        summary = self.summary()
+        print(f"Latency over {len(self.rows)} chunks [ms], _est: from the estimated first byte:")
+        for key, q in summary.items():
+            print(f"  {key:>19s}  " + "  ".join(f"{k}={v:7.2f}" for k, v in q.items()))
+
+    def dump(self, path):
+        """Save the raw stamps (seconds, one column per stage) as CSV."""
+        np.savetxt(path, self.rows, delimiter=",", header=",".join(STAGES), comments="")
@@ -1,25 +1,24 @@
+import numpy as np
 import pygame
 import random
+import time
+
+from render import CachedText, DirtyRenderer
 
 
 class Pong:
 
-    def __init__(self, cpuPlayStyle="following"):
+    def __init__(self, cpuPlayStyle="following", headless=False, seed=None):
         ### initialize game
-        pygame.init()
-
-        ### setup display
+        # headless: no window and no clock, update() only advances the game by
+        # one frame, so recorded EMG can be played back fast (see simulate.py)
+        self.headless = headless
         self.DISPLAY_SIZE = self.DISPLAY_WIDTH, self.DISPLAY_HEIGHT = 800, 600
-        self.screen = pygame.display.set_mode(self.DISPLAY_SIZE)
-
-        ### set window caption
-        pygame.display.set_caption("Future Game by Kevin Narain")
+        if not headless:
+            self.init_display()
 
-        ### clock
-        self.clock = pygame.time.Clock()
-
-        ### hide cursor
-        pygame.mouse.set_visible(False)
+        ### random numbers, seeded for reproducible runs
+        self.rng = random.Random(seed)
 
         ### game constants
         # buttons
@@ -66,6 +65,10 @@ class Pong:
             # computer will simulate random clicks
             self.p2_handle_event = self.random_handle_event
             self.p2_update = self.random_update
+        elif p2_type == "emg":
+            # a second player with their own SpikerBox, see p2_handle_input
+            self.p2_handle_event = self.emg_handle_event
+            self.p2_update = self.emg_update
         elif p2_type == "following":
             # computer will follor ball
             self.p2_handle_event = self.following_handle_event
@@ -75,6 +78,35 @@ class Pong:
             self.p2_handle_event = self.human_handle_event
             self.p2_update = self.human_update
 
+    def init_display(self):
+        pygame.init()
+
+        ### setup display
+        self.screen = pygame.display.set_mode(self.DISPLAY_SIZE)
+
+        ### set window caption
+        pygame.display.set_caption("Future Game by Kevin Narain")
+
+        ### clock
+        self.clock = pygame.time.Clock()
+
+        ### hide cursor
+        pygame.mouse.set_visible(False)
+
+        ### rendering
+        # the center line never moves, so it is drawn once into the background
+        background = pygame.Surface(self.DISPLAY_SIZE)
+        background.fill(pygame.Color(0, 0, 0, 255))
+        pygame.draw.rect(
+            background,
+            pygame.Color(255, 255, 255, 255),
+            (self.DISPLAY_WIDTH / 2, 0, 1, self.DISPLAY_HEIGHT),
+        )
+        self.renderer = DirtyRenderer(self.screen, background)
+        score_font = pygame.font.Font(None, 30)
+        self.p1_score_text = CachedText(score_font, pygame.Color(255, 255, 255, 255))
+        self.p2_score_text = CachedText(score_font, pygame.Color(255, 255, 255, 255))
+
     def set_new_paddle(self, playerPaddle):
         self.PLAYER_PAD_LENGTH = playerPaddle
 
@@ -87,7 +119,7 @@ class Pong:
     def random_update(self):
         global p2_move_up, p2_move_down
 
-        move = random.randint(1, 2)
+        move = self.rng.randint(1, 2)
 
         if move == 1:  # up
             self.p2_move_up = True
@@ -118,6 +150,25 @@ class Pong:
             self.p2_move_up = False
             self.p2_move_down = False
 
+    # --- player2 - second EMG player
+
+    def emg_handle_event(self, event):
+        # do nothing, input comes from p2_handle_input
+        pass
+
+    def emg_update(self):
+        # do nothing
+        pass
+
+    def p2_handle_input(self, emg_val, threshold):
+        active = np.asarray(emg_val) > threshold
+        if active.size > 1:
+            self.p2_move_up = bool(active[0] and not active[1])
+            self.p2_move_down = bool(active[1] and not active[0])
+        else:
+            self.p2_move_up = bool(active)
+            self.p2_move_down = not self.p2_move_up
+
     # --- player2 - human
 
     def human_handle_event(self, event):
@@ -143,12 +194,36 @@ class Pong:
     def handle_input(self, emg_val, threshold):
         self.p1_handle_event(emg_val, threshold)
 
+    def handle_window_event(self, event):
+        # repaint everything after the window was exposed or restored
+        if not self.headless:
+            self.renderer.handle_event(event)
+
+    def handle_emg_event(self, kind, channel):
+        # onset/offset events from events.py: move while the muscle is contracted
+        onset = kind > 0
+        if channel == 0:
+            self.p1_move_up = onset
+            self.p1_move_down = not onset
+        elif onset:
+            # a second channel moves down
+            self.p1_move_up = False
+            self.p1_move_down = True
+        else:
+            self.p1_move_down = False
+
     ### Alter this block if you want to expand gameplay options ###
     ###############################################################
     def p1_handle_event(self, running_mean_tmp, movementThreshold):
         global p1_move_up, p1_move_down
 
-        if running_mean_tmp > movementThreshold:
+        # running_mean_tmp is one value, or one value per EMG channel
+        active = np.asarray(running_mean_tmp) > movementThreshold
+        if active.size > 1:
+            # two muscles: the first one moves up, the second one down
+            self.p1_move_up = bool(active[0] and not active[1])
+            self.p1_move_down = bool(active[1] and not active[0])
+        elif active:
             self.p1_move_up = True
             self.p1_move_down = False
         else:
@@ -162,28 +237,27 @@ class Pong:
         pass
 
     def draw(self):
+        if self.headless:
+            return
 
-        ## clear the screen
-        self.screen.fill(pygame.Color(0, 0, 0, 255))
+        ## erase what was drawn last frame (the center line is in the background)
+        self.renderer.clear()
 
         ## draw ball
-        pygame.draw.circle(
-            self.screen,
+        self.renderer.circle(
             pygame.Color(255, 255, 255, 255),
             (self.ball_x, self.ball_y),
             self.BALL_RADIUS,
         )
 
         ## draw P1 pad
-        pygame.draw.rect(
-            self.screen,
+        self.renderer.rect(
             pygame.Color(255, 255, 255, 255),
             (0, self.p1_pad_y, self.PLAYER_PAD_WIDTH, self.PLAYER_PAD_LENGTH),
         )
 
         ## draw P2 pad
-        pygame.draw.rect(
-            self.screen,
+        self.renderer.rect(
             pygame.Color(255, 255, 255, 255),
             (
                 self.DISPLAY_WIDTH - self.PLAYER_PAD_WIDTH,
@@ -193,33 +267,17 @@ class Pong:
             ),
         )
 
-        ## draw center line
-        pygame.draw.rect(
-            self.screen,
-            pygame.Color(255, 255, 255, 255),
-            (self.DISPLAY_WIDTH / 2, 0, 1, self.DISPLAY_HEIGHT),
-        )
-
-        ## draw player scores
-        # create font
-        score_font = pygame.font.Font(None, 30)
-
-        # draw p1 score
-        p1_score_text = str(self.p1_score)
-        p1_score_render = score_font.render(
-            p1_score_text, 1, pygame.Color(255, 255, 255, 255)
+        ## draw player scores, rendered again only when they change
+        self.renderer.blit(
+            self.p1_score_text.render(self.p1_score), (self.DISPLAY_WIDTH / 2 - 50, 50)
         )
-        self.screen.blit(p1_score_render, (self.DISPLAY_WIDTH / 2 - 50, 50))
-
-        # draw p2 score
-        p2_score_text = str(self.p2_score)
-        p2_score_render = score_font.render(
-            p2_score_text, 1, pygame.Color(255, 255, 255, 255)
+        self.renderer.blit(
+            self.p2_score_text.render(self.p2_score), (self.DISPLAY_WIDTH / 2 + 50, 50)
         )
-        self.screen.blit(p2_score_render, (self.DISPLAY_WIDTH / 2 + 50, 50))
 
-        ## pygame.display.flip() is called in order to update graphics properly
-        pygame.display.flip()
+        ## only the parts of the screen that changed are sent to the display
+        self.renderer.present()
+        self.flip_time = time.perf_counter()
 
         ## tick the clock so we have 60 fps game
         self.clock.tick(60)
@@ -0,0 +1,143 @@
+"""Record EMG sessions to disk and read them back without loading them.
+
+A session is a directory of append-only binary files:
+
+    raw.bin       the bytes as they came from the SpikerBox (uint8)
+    samples.bin   decoded, centered samples (float32, `channels` per row)
+    features.bin  computed features (float32, `width` per row)
+    index.bin     one record per chunk: arrival time and the end offset of
+                  the chunk in each of the files above
+    meta.json     sample rate, row widths and the wall-clock start time
+
+Writing a chunk is a few unbuffered `write` calls of existing buffers, so
+recording costs next to nothing during play, and everything up to the last
+chunk is on disk even if the process is killed. `Session` memory-maps the
+files, and every range it returns is a view into the map, so slicing an
+hour-long recording is instant.
+"""
+
+import json
+import os
+import time
+
+import numpy as np
+
+INDEX_DTYPE = np.dtype(
+    [("time", "<f8"), ("raw", "<i8"), ("samples", "<i8"), ("features", "<i8")]
+)
+SAMPLE_DTYPE = np.dtype("<f4")
+
+
+class SessionRecorder:
+    """Append chunks of one session to `path` (a directory, created if needed).
+
+    Every session needs its own directory: if `path` already holds one, this
+    raises `FileExistsError` rather than mix two recordings.
+    """
+
+    def __init__(self, path, sample_rate, channels=1, width=1):
+        os.makedirs(path, exist_ok=True)
+        self.path = path
+        self._start = time.perf_counter()
+        meta = {
+            "sample_rate": sample_rate,
+            "channels": channels,
+            "width": width,
+            "start_time": time.time(),
+        }
+        with open(os.path.join(path, "meta.json"), "x") as f:
+            json.dump(meta, f, indent=2)
+        self._files = {
+            name: open(os.path.join(path, name + ".bin"), "xb", buffering=0)
+            for name in ("raw", "samples", "features", "index")
+        }
+        self._entry = np.zeros(1, dtype=INDEX_DTYPE)
+
+    def _append(self, name, array, dtype):
+        array = np.ascontiguousarray(array, dtype=dtype)
+        self._files[name].write(memoryview(array).cast("B"))
+        return array.size
+
+    def write(self, raw, samples, features):
+        """Append one chunk: raw bytes, decoded samples and their features.
+
+        Reads that did not complete a frame are written with empty samples
+        and features, so raw.bin holds every byte that was read.
+        """
+        entry = self._entry[0]
+        entry["time"] = time.perf_counter() - self._start
+        entry["raw"] += self._append("raw", raw, np.uint8)
+        entry["samples"] += self._append("samples", samples, SAMPLE_DTYPE)
+        entry["features"] += self._append("features", features, SAMPLE_DTYPE)
+        # the index goes last, so readers never see a half-written chunk
+        self._files["index"].write(self._entry.tobytes())
+
+    def close(self):
+        for f in self._files.values():
+            f.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def _map(path, dtype, width=None):
+    if not os.path.exists(path) or os.path.getsize(path) == 0:
+        array = np.zeros(0, dtype=dtype)
+    else:
+        array = np.memmap(path, dtype=dtype, mode="r")
+    if width is not None:
+        array = array[: len(array) - len(array) % width].reshape(-1, width)
+    return array
+
+
+class Session:
+    """Read-only, memory-mapped view of a recorded session.
+
+    Times are in seconds since the recording started. Only the chunk arrival
+    times are stored, sample times in between are interpolated.
+    """
+
+    def __init__(self, path):
+        with open(os.path.join(path, "meta.json")) as f:
+            self.meta = json.load(f)
+        self.sample_rate = self.meta["sample_rate"]
+        self.index = _map(os.path.join(path, "index.bin"), INDEX_DTYPE)
+        # a chunk is only complete once its index record is written
+        end = self.index[-1] if len(self.index) else np.zeros((), INDEX_DTYPE)
+        self.raw = _map(os.path.join(path, "raw.bin"), np.uint8)[: end["raw"]]
+        samples = _map(os.path.join(path, "samples.bin"), SAMPLE_DTYPE, self.meta["channels"])
+        self.samples = samples[: end["samples"] // self.meta["channels"]]
+        features = _map(os.path.join(path, "features.bin"), SAMPLE_DTYPE, self.meta["width"])
+        self.features = features[: end["features"] // self.meta["width"]]
+
+    @property
+    def duration(self):
+        return float(self.index["time"][-1]) if len(self.index) else 0.0
+
+    def _rows(self, column, per_row, t0, t1):
+        """Row range of `column` that covers times t0..t1."""
+        times = np.concatenate(([0.0], self.index["time"]))
+        ends = np.concatenate(([0], self.index[column])) // per_row
+        start, stop = np.interp([t0, t1], times, ends)
+        return int(start), int(np.ceil(stop))
+
+    def raw_range(self, t0, t1):
+        start, stop = self._rows("raw", 1, t0, t1)
+        return self.raw[start:stop]
+
+    def sample_range(self, t0, t1):
+        start, stop = self._rows("samples", self.meta["channels"], t0, t1)
+        return self.samples[start:stop]
+
+    def feature_range(self, t0, t1):
+        start, stop = self._rows("features", self.meta["width"], t0, t1)
+        return self.features[start:stop]
+
+    def sample_times(self):
+        """Interpolated time of every sample (this one does allocate)."""
+        times = np.concatenate(([0.0], self.index["time"]))
+        ends = np.concatenate(([0], self.index["samples"])) // self.meta["channels"]
+        return np.interp(np.arange(len(self.samples)) + 1, ends, times)
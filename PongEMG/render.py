@@ -0,0 +1,109 @@
+"""Rendering helpers shared by the games.
+
+Redrawing and flipping the whole window every frame takes a good part of the
+16.7 ms frame budget on a slow laptop, time the EMG side could use. Here the
+static parts of the scene are drawn once into a background layer, and every
+frame only the rectangles where something was drawn, in this frame or the
+previous one, are erased and sent to the display:
+
+    renderer.clear()              # erase last frame's objects
+    renderer.rect(WHITE, paddle)  # draw this frame's objects
+    renderer.blit(score.render(points), (350, 50))
+    renderer.present()            # update only the dirty rectangles
+
+Text is rendered once per value with `CachedText`. When the window was
+covered, minimized or otherwise lost its contents, pass the event to
+`DirtyRenderer.handle_event` so the next frame repaints all of it.
+"""
+
+import pygame
+
+# events after which the window contents must be drawn again (the WINDOW*
+# events only exist in pygame 2)
+REDRAW_EVENTS = tuple(
+    getattr(pygame, name)
+    for name in ("VIDEOEXPOSE", "WINDOWEXPOSED", "WINDOWRESTORED")
+    if hasattr(pygame, name)
+)
+
+
+class CachedText:
+    """A text surface that is only rendered again when its value changes."""
+
+    def __init__(self, font, color, antialias=True):
+        self.font = font
+        self.color = color
+        self.antialias = antialias
+        self._value = None
+        self._surface = None
+
+    def render(self, value):
+        if self._surface is None or value != self._value:
+            self._value = value
+            self._surface = self.font.render(str(value), self.antialias, self.color)
+        return self._surface
+
+
+class DirtyRenderer:
+    """Draws on `screen` and updates only the parts of it that changed.
+
+    Arguments:
+    screen: The display surface.
+    background: A surface with everything that never moves, or a color.
+    convert: Convert the background to the display's pixel format, which
+        makes restoring it much faster. Leave on unless the background needs
+        per-pixel alpha.
+    """
+
+    def __init__(self, screen, background=(0, 0, 0), convert=True):
+        self.screen = screen
+        if not isinstance(background, pygame.Surface):
+            color = background
+            background = pygame.Surface(screen.get_size())
+            background.fill(color)
+        self.background = background.convert() if convert else background
+        self._drawn = []  # rects drawn in the previous frame
+        self._dirty = []  # rects that must be sent to the display this frame
+        self._full = True
+
+    def invalidate(self):
+        """Redraw and flip the whole screen on the next frame."""
+        self._full = True
+
+    def handle_event(self, event):
+        """`invalidate` if `event` means the window lost its contents."""
+        if event.type in REDRAW_EVENTS:
+            self.invalidate()
+
+    def clear(self):
+        """Start a frame by erasing everything drawn in the last one."""
+        if self._full:
+            self.screen.blit(self.background, (0, 0))
+        else:
+            for rect in self._drawn:
+                self.screen.blit(self.background, rect, rect)
+        self._dirty = self._drawn
+        self._drawn = []
+
+    def blit(self, surface, pos):
+        rect = self.screen.blit(surface, pos)
+        self._drawn.append(rect)
+        return rect
+
+    def rect(self, color, rect):
+        rect = pygame.draw.rect(self.screen, color, rect)
+        self._drawn.append(rect)
+        return rect
+
+    def circle(self, color, center, radius):
+        rect = pygame.draw.circle(self.screen, color, center, radius)
+        self._drawn.append(rect)
+        return rect
+
+    def present(self):
+        """End the frame: send the erased and the new rects to the display."""
+        if self._full:
+            pygame.display.flip()
+            self._full = False
+        else:
+            pygame.display.update(self._dirty + self._drawn)
@@ -0,0 +1,286 @@
+"""Live EMG scope.
+
+The live view in `spike_stream_threshold.ipynb` redraws the whole figure for
+every chunk and rebuilds its buffers sample by sample, which limits it to a
+few frames per second. Here the signal goes into a preallocated circular
+buffer that keeps, for every pixel column of the plot, the minimum and
+maximum of the samples that fall into it. Drawing a frame only touches
+`columns` values per channel, whatever the sample rate, and short spikes stay
+visible because the extremes of every column are drawn.
+
+Two backends draw the buffer: `MatplotlibScope` (blitting, only the traces
+are redrawn) and `PygameScope` (each trace is one polyline, drawn into a
+dirty rectangle). Run it from the command line:
+
+    python scope.py --port COM3
+    python scope.py --port hub:127.0.0.1:8765 --backend matplotlib
+
+The "hub:" port lets the scope run next to the game, see hub.py.
+"""
+
+import argparse
+import time
+
+import numpy as np
+
+from spikerbox_serial import (
+    FRAME_SIZE,
+    SAMPLE_RATE,
+    ByteRing,
+    FrameDecoder,
+    init_serial,
+    read_available,
+)
+
+
+class ScopeBuffer:
+    """Circular buffer of the last `samples` samples, reduced per column.
+
+    The samples are split into `columns` consecutive groups (one per pixel
+    column of the display) and the min/max of every group is updated as the
+    samples are written, so `minmax()` never has to look at the samples.
+
+    Attributes:
+    per_column: Samples per column; the buffer holds `columns * per_column`
+        samples, i.e. `samples` rounded up to a whole number of columns.
+    written: Total number of samples written so far.
+    """
+
+    def __init__(self, samples, columns, channels=1):
+        self.columns = columns
+        self.channels = channels
+        self.per_column = max(1, -(-samples // columns))
+        self.size = self.per_column * columns
+        self._data = np.zeros((self.size, channels))
+        self._lo = np.zeros((columns, channels))
+        self._hi = np.zeros((columns, channels))
+        self.written = 0
+
+    def write(self, x):
+        """Append a chunk of shape `(n,)` or `(n, channels)`."""
+        x = np.asarray(x, dtype=np.float64)
+        x = x.reshape(len(x), self.channels)
+        if len(x) == 0:
+            return
+        if len(x) > self.size:
+            self.written += len(x) - self.size
+            x = x[-self.size:]
+        start = self.written % self.size
+        end = start + len(x)
+        if end <= self.size:
+            self._data[start:end] = x
+            self._reduce(start, end)
+        else:
+            split = self.size - start
+            self._data[start:] = x[:split]
+            self._data[: end - self.size] = x[split:]
+            self._reduce(start, self.size)
+            self._reduce(0, end - self.size)
+        self.written += len(x)
+
+    def _reduce(self, start, end):
+        """Update the min/max of the columns that samples start..end fall in."""
+        pc = self.per_column
+        first, full = start // pc, end // pc
+        if full > first:
+            block = self._data[first * pc : full * pc].reshape(full - first, pc, -1)
+            block.min(axis=1, out=self._lo[first:full])
+            block.max(axis=1, out=self._hi[first:full])
+        if end % pc:
+            # the column being filled: only its new part, not the last sweep
+            part = self._data[full * pc : end]
+            part.min(axis=0, out=self._lo[full])
+            part.max(axis=0, out=self._hi[full])
+
+    def minmax(self):
+        """Per-column `(min, max)`, each `(columns, channels)`, oldest first."""
+        if self.written == 0:
+            return self._lo, self._hi
+        head = ((self.written - 1) % self.size) // self.per_column
+        return np.roll(self._lo, -head - 1, axis=0), np.roll(self._hi, -head - 1, axis=0)
+
+
+class MatplotlibScope:
+    """Draws a `ScopeBuffer` into a matplotlib axes using blitting.
+
+    Every channel is one line that zig-zags between the min and max of each
+    column. The axes, ticks and labels are drawn once and restored from a
+    saved background on every frame; only the lines are drawn again.
+    """
+
+    def __init__(self, buffer, sample_rate, ax, ylim=(-250, 250)):
+        self.buffer = buffer
+        self.ax = ax
+        self.canvas = ax.figure.canvas
+        seconds = buffer.size / sample_rate
+        x = np.repeat(np.linspace(-seconds, 0, buffer.columns), 2)
+        self._y = np.zeros(2 * buffer.columns)
+        self.lines = [
+            ax.plot(x, self._y, lw=1, animated=True)[0] for _ in range(buffer.channels)
+        ]
+        ax.set_xlim(-seconds, 0)
+        ax.set_ylim(*ylim)
+        ax.set_xlabel("time (s)")
+        self._background = None
+        # a resize or any full redraw invalidates the saved background
+        self.canvas.mpl_connect("draw_event", self._on_draw)
+
+    def _on_draw(self, event):
+        self._background = self.canvas.copy_from_bbox(self.ax.bbox)
+        for line in self.lines:
+            self.ax.draw_artist(line)
+
+    def is_open(self):
+        import matplotlib.pyplot as plt
+
+        return plt.fignum_exists(self.ax.figure.number)
+
+    def update(self):
+        if self._background is None:
+            self.canvas.draw()
+        lo, hi = self.buffer.minmax()
+        self.canvas.restore_region(self._background)
+        for c, line in enumerate(self.lines):
+            self._y[0::2] = lo[:, c]
+            self._y[1::2] = hi[:, c]
+            line.set_ydata(self._y)
+            self.ax.draw_artist(line)
+        self.canvas.blit(self.ax.bbox)
+        self.canvas.flush_events()
+
+
+class PygameScope:
+    """Draws a `ScopeBuffer` into (part of) a pygame surface.
+
+    Every channel gets a horizontal lane of `rect`, which must be exactly one
+    pixel per buffer column wide, and is drawn as a single polyline that
+    zig-zags between the min and max of each column (one C call per channel,
+    however many samples are shown). `update` returns the rectangle it drew,
+    for `pygame.display.update`; after the window lost its contents, that is
+    the whole surface.
+    """
+
+    def __init__(
+        self,
+        buffer,
+        surface,
+        rect=None,
+        ylim=(-250, 250),
+        color=(0, 255, 0),
+        background=(0, 0, 0),
+    ):
+        import pygame
+
+        self.buffer = buffer
+        self.surface = surface
+        self.rect = pygame.Rect(rect) if rect is not None else surface.get_rect()
+        if self.rect.width != buffer.columns:
+            raise ValueError(
+                f"rect is {self.rect.width} pixels wide but the buffer has "
+                f"{buffer.columns} columns"
+            )
+        self.ylim = ylim
+        self.color = color
+        self.background = background
+        self.lane = self.rect.height // buffer.channels
+        self._points = np.zeros((2 * buffer.columns, 2), dtype=np.intp)
+        self._points[:, 0] = self.rect.x + np.repeat(np.arange(buffer.columns), 2)
+        self._exposed = False
+
+    def is_open(self):
+        """Handle the window's events; False once it was closed."""
+        import pygame
+        from render import REDRAW_EVENTS
+
+        # take every event, or the queue fills up and exposes go unseen
+        is_open = True
+        for event in pygame.event.get():
+            if event.type == pygame.QUIT:
+                is_open = False
+            elif event.type in REDRAW_EVENTS:
+                self._exposed = True
+        return is_open
+
+    def update(self):
+        import pygame
+
+        lo, hi = self.buffer.minmax()
+        y_min, y_max = self.ylim
+        scale = (self.lane - 1) / (y_max - y_min)
+        self.surface.fill(self.background, self.rect)
+        for c in range(self.buffer.channels):
+            top = self.rect.y + c * self.lane
+            y = self._points[:, 1]
+            y[0::2] = np.clip((y_max - hi[:, c]) * scale, 0, self.lane - 1)
+            y[1::2] = np.clip((y_max - lo[:, c]) * scale, 0, self.lane - 1)
+            y += top
+            pygame.draw.lines(self.surface, self.color, False, self._points.tolist())
+        if self._exposed:
+            self._exposed = False
+            return self.surface.get_rect()
+        return self.rect
+
+
+def run(
+    cport,
+    backend="pygame",
+    seconds=2.0,
+    channels=1,
+    size=(800, 300),
+    ylim=(-250, 250),
+    fps=60,
+):
+    """Show the live signal from `cport` until the window is closed."""
+    rate = SAMPLE_RATE // channels
+    width, height = size
+    if backend == "pygame":
+        import pygame
+
+        pygame.init()
+        screen = pygame.display.set_mode(size)
+        pygame.display.set_caption("EMG scope")
+        buffer = ScopeBuffer(int(seconds * rate), width, channels)
+        scope = PygameScope(buffer, screen, ylim=ylim)
+        show = lambda: pygame.display.update(scope.update())
+    elif backend == "matplotlib":
+        import matplotlib.pyplot as plt
+
+        fig, ax = plt.subplots(figsize=(width / 100, height / 100), dpi=100)
+        plt.show(block=False)
+        buffer = ScopeBuffer(int(seconds * rate), int(ax.bbox.width), channels)
+        scope = MatplotlibScope(buffer, rate, ax, ylim=ylim)
+        show = scope.update
+    else:
+        raise ValueError(f"unknown backend {backend!r}")
+
+    ser = init_serial(cport, timeout=0)
+    ring = ByteRing(FRAME_SIZE * SAMPLE_RATE)
+    decoder = FrameDecoder(channels)
+    next_frame = time.perf_counter()
+    while scope.is_open():
+        samples = decoder.decode(read_available(ser, ring, ring.capacity // 2))
+        if len(samples):
+            buffer.write(np.subtract(samples, 500, out=samples))
+        show()
+        next_frame += 1.0 / fps
+        delay = next_frame - time.perf_counter()
+        if delay > 0:
+            time.sleep(delay)
+        else:
+            next_frame = time.perf_counter()
+    ser.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Live EMG scope.")
+    parser.add_argument("--port", default="COM3", help="serial port, 'emulator' or 'hub:<address>'")
+    parser.add_argument("--backend", choices=("pygame", "matplotlib"), default="pygame")
+    parser.add_argument("--seconds", type=float, default=2.0, help="time shown")
+    parser.add_argument("--channels", type=int, default=1)
+    parser.add_argument("--fps", type=int, default=60)
+    args = parser.parse_args(argv)
+    run(args.port, args.backend, args.seconds, args.channels, fps=args.fps)
+
+
+if __name__ == "__main__":
+    main()
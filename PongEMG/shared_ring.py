@@ -0,0 +1,130 @@
+"""Shared-memory ring buffer for passing sample streams between processes.
+
+One process (the EMG reader) writes rows of samples or features, any number
+of other processes (the game, a plotter, ...) read recent windows of them.
+There are no locks, it works like a seqlock: the writer announces which rows
+it is about to overwrite, fills in the data and then bumps a sequence counter.
+Readers copy the rows the counter says are done and check afterwards that
+no write announced in the meantime reached them, or copy them again.
+"""
+
+from multiprocessing import shared_memory
+
+import numpy as np
+
+_HEADER = np.dtype(np.int64).itemsize * 2
+
+
+class SharedRing:
+    """Single-writer, multi-reader ring of `(capacity, width)` samples.
+
+    Every row is stored twice, at `i` and `i + capacity`, so the most recent
+    `n <= capacity` rows are always one contiguous slice and are copied out
+    in one go. The ring can be passed to a `multiprocessing.Process` as
+    an argument; the child attaches to the same block of shared memory.
+
+    Attributes:
+    seq: Total number of rows written so far.  Row `k` of the stream is
+        available while `seq - capacity <= k < seq`.
+    """
+
+    def __init__(self, capacity, width=1, dtype=np.float64, name=None):
+        self.capacity = int(capacity)
+        self.width = int(width)
+        self.dtype = np.dtype(dtype)
+        nbytes = _HEADER + 2 * self.capacity * self.width * self.dtype.itemsize
+        if name is None:
+            self._shm = shared_memory.SharedMemory(create=True, size=nbytes)
+            self._owner = True
+        else:
+            self._shm = shared_memory.SharedMemory(name=name)
+            self._owner = False
+        # [0]: rows written, [1]: rows written once the current write is done
+        self._header = np.ndarray((2,), dtype=np.int64, buffer=self._shm.buf)
+        self._data = np.ndarray(
+            (2 * self.capacity, self.width),
+            dtype=self.dtype,
+            buffer=self._shm.buf,
+            offset=_HEADER,
+        )
+        if self._owner:
+            self._header[:] = 0
+
+    @classmethod
+    def attach(cls, name, capacity, width=1, dtype=np.float64):
+        """Open an existing ring created by another process."""
+        return cls(capacity, width, dtype, name=name)
+
+    def __reduce__(self):
+        return (
+            SharedRing.attach,
+            (self.name, self.capacity, self.width, self.dtype.str),
+        )
+
+    @property
+    def name(self):
+        return self._shm.name
+
+    @property
+    def seq(self):
+        return int(self._header[0])
+
+    def write(self, rows):
+        """Append rows (shape `(n,)` or `(n, width)`). Only one process may write."""
+        rows = np.asarray(rows, dtype=self.dtype).reshape(-1, self.width)
+        if len(rows) > self.capacity:
+            skipped = len(rows) - self.capacity
+            rows = rows[skipped:]
+        else:
+            skipped = 0
+        seq = self.seq + skipped
+        n = len(rows)
+        pos = seq % self.capacity
+        first = min(n, self.capacity - pos)
+        cap = self.capacity
+        # rows older than seq + n - capacity are about to be overwritten
+        self._header[1] = seq + n
+        self._data[pos:pos + first] = rows[:first]
+        self._data[pos + cap:pos + cap + first] = rows[:first]
+        self._data[:n - first] = rows[first:]
+        self._data[cap:cap + n - first] = rows[first:]
+        # publish only once the data is in place
+        self._header[0] = seq + n
+
+    def _copy(self, start, stop):
+        """Copy of stream rows `start <= k < stop`, or None if a write tore it."""
+        offset = start % self.capacity
+        rows = self._data[offset:offset + stop - start].copy()
+        if start < self._header[1] - self.capacity:
+            return None
+        return rows
+
+    def latest(self, n):
+        """Copy of the last `n` rows written (fewer if not yet available)."""
+        while True:
+            seq = self.seq
+            count = min(int(n), self.capacity, seq)
+            rows = self._copy(seq - count, seq)
+            if rows is not None:
+                return rows
+
+    def window(self, start, stop):
+        """Copy of stream rows `start <= k < stop`, clipped to what is still held."""
+        while True:
+            seq = self.seq
+            first = max(start, seq - self.capacity, 0)
+            last = min(stop, seq)
+            if last <= first:
+                return self._data[:0].copy()
+            rows = self._copy(first, last)
+            if rows is not None:
+                return rows
+
+    def close(self):
+        self._header = self._data = None
+        self._shm.close()
+
+    def unlink(self):
+        """Free the shared memory; call once, from the process that created it."""
+        if self._owner:
+            self._shm.unlink()
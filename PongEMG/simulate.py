@@ -0,0 +1,125 @@
+"""Play the games offline, faster than real time, to compare settings.
+
+The games run headless (no window, no clock): every `update()` advances one
+frame of 1/60 s, and the input for that frame is computed from a recorded
+session (see recorder.py) or a synthetic signal the same way `game_loop` in
+stream.py computes it live, the mean of the last `window` feature rows. This
+scores a `movementThreshold`, or a feature pipeline, in a fraction of a
+second per run:
+
+    python simulate.py --session sessions/run1 --game flappy --threshold 16 24 32
+    python simulate.py --seconds 60 --game pong --threshold 20 40
+"""
+
+import argparse
+
+import numpy as np
+
+from emulator import synthesize_emg
+from spikerbox_serial import SAMPLE_RATE
+
+FPS = 60
+
+
+def frame_inputs(features, sample_rate, window, fps=FPS):
+    """Input value of every game frame, shape `(frames, channels)`.
+
+    Frame `i` sees the mean of the `window` feature rows before the end of
+    its 1/fps slice of the stream, like the game does live.
+    """
+    features = np.asarray(features, dtype=np.float64)
+    features = features.reshape(len(features), -1)
+    frames = int(len(features) * fps / sample_rate)
+    ends = (np.arange(1, frames + 1) * sample_rate / fps).astype(np.intp)
+    starts = np.maximum(ends - window, 0)
+    cumsum = np.zeros((len(features) + 1, features.shape[1]))
+    np.cumsum(features, axis=0, out=cumsum[1:])
+    return (cumsum[ends] - cumsum[starts]) / (ends - starts)[:, None]
+
+
+def session_features(path, make_features=None):
+    """Features of a recorded session, and its sample rate.
+
+    With `make_features`, the features are computed again from the recorded
+    samples, so a different pipeline can be tried on the same recording.
+    """
+    from recorder import Session
+
+    session = Session(path)
+    if make_features is None:
+        return session.features, session.sample_rate
+    return make_features()(np.asarray(session.samples, dtype=np.float64)), session.sample_rate
+
+
+def synthetic_features(seconds, make_features, seed=0, **kwargs):
+    """Features of `synthesize_emg(seconds, ...)`, centered like the EMG process does."""
+    signal = synthesize_emg(seconds, seed=seed, **kwargs) - 500
+    return make_features()(signal), SAMPLE_RATE
+
+
+def make_game(name, seed=0, playerPaddle=None):
+    if name == "flappy":
+        from flappy import Flappy
+
+        return Flappy(headless=True, seed=seed)
+    if name == "pong":
+        from pong import Pong
+
+        game = Pong(cpuPlayStyle="following", headless=True, seed=seed)
+        if playerPaddle is not None:
+            game.set_new_paddle(playerPaddle)
+        return game
+    raise ValueError("Invalid game")
+
+
+def play(game, inputs, threshold):
+    """Run `game` on one input row per frame until it ends or the input does.
+
+    Returns a dict with the number of frames played and the score(s).
+    """
+    steps = 0
+    for value in inputs:
+        game.handle_input(value[0] if len(value) == 1 else value, threshold)
+        game.update()
+        steps += 1
+        if getattr(game, "done", False):
+            break
+    result = {"steps": steps, "seconds": steps / FPS}
+    if hasattr(game, "p1_score"):
+        result.update(p1_score=game.p1_score, p2_score=game.p2_score)
+    else:
+        result.update(score=game.score, done=game.done)
+    return result
+
+
+def sweep(inputs, thresholds, game="flappy", seed=0, **game_kwargs):
+    """`play` a fresh, identically seeded game for every threshold."""
+    return {
+        threshold: play(make_game(game, seed, **game_kwargs), inputs, threshold)
+        for threshold in thresholds
+    }
+
+
+def main(argv=None):
+    from stream import make_features
+
+    parser = argparse.ArgumentParser(description="Score thresholds on recorded EMG.")
+    parser.add_argument("--session", help="recorded session folder (default: synthetic EMG)")
+    parser.add_argument("--seconds", type=float, default=60.0, help="length of synthetic EMG")
+    parser.add_argument("--game", choices=("flappy", "pong"), default="flappy")
+    parser.add_argument("--threshold", type=float, nargs="+", default=[24.0])
+    parser.add_argument("--window", type=int, default=1000, help="feature rows per input")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+
+    if args.session:
+        features, rate = session_features(args.session)
+    else:
+        features, rate = synthetic_features(args.seconds, make_features, args.seed)
+    inputs = frame_inputs(features, rate, args.window)
+    for threshold, result in sweep(inputs, args.threshold, args.game, args.seed).items():
+        print(threshold, result)
+
+
+if __name__ == "__main__":
+    main()
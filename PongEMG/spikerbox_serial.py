@@ -1,30 +1,232 @@
+import os
+
 import numpy as np
 import serial
 
+# Every SpikerBox frame is 2 bytes: the first byte has its top bit set and
+# carries the high 7 bits of the sample, the second byte carries the low 7 bits.
+FRAME_SIZE = 2
+# samples per second, i.e. 20000 bytes/s on the wire; with several channels
+# the same byte rate is shared, so each channel gets SAMPLE_RATE // channels
+SAMPLE_RATE = 10000
+
+
 def read_arduino(ser,inputBufferSize):
 #    data = ser.readline(inputBufferSize)
     data = ser.read(inputBufferSize)
     out =[(int(data[i])) for i in range(0,len(data))]
     return out
 
+
+class ByteRing:
+    """Preallocated byte buffer that serial reads are written into.
+
+    Reads go into consecutive regions of one bytearray and wrap around to the
+    start when the end is reached, so the caller gets a uint8 view instead of
+    a bytes object and a list of ints per read. Bytes that are already
+    waiting on a POSIX serial port are read straight into the ring with
+    `os.readv`; any other read goes through the port's `readinto`, which for
+    pyserial still makes one temporary bytes object. The returned arrays are
+    views into the ring and stay valid until the ring wraps around onto them
+    (i.e. for about `capacity` bytes).
+    """
+
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self._buf = bytearray(capacity)
+        self._view = memoryview(self._buf)
+        self._array = np.frombuffer(self._buf, dtype=np.uint8)
+        self._pos = 0
+
+    def readinto(self, ser, size, waiting=0):
+        """Read up to `size` bytes from `ser` and return them as a uint8 view.
+
+        `waiting` is the caller's latest `ser.in_waiting`; when all `size`
+        bytes are already there, they are read without going through pyserial.
+        """
+        size = min(size, self.capacity)
+        if self._pos + size > self.capacity:
+            self._pos = 0
+        start = self._pos
+        region = self._view[start:start + size]
+        fd = getattr(ser, "fd", None)
+        if size and size <= waiting and fd is not None:
+            try:
+                n = os.readv(fd, [region])
+            except BlockingIOError:
+                n = 0
+        else:
+            n = ser.readinto(region) or 0
+        self._pos = start + n
+        return self._array[start:start + n]
+
+
+def read_arduino_into(ser, ring, inputBufferSize):
+    """`read_arduino` into a `ByteRing`, returning a uint8 view.
+
+    Blocks for `inputBufferSize` bytes like `read_arduino`, but also drains
+    whatever else is already waiting so the reader never falls behind.
+    """
+    waiting = ser.in_waiting
+    return ring.readinto(ser, max(inputBufferSize, waiting), waiting)
+
+
+def read_available(ser, ring, max_bytes):
+    """Read whatever is already waiting (at most `max_bytes`), without blocking."""
+    waiting = ser.in_waiting
+    return ring.readinto(ser, min(waiting, max_bytes), waiting)
+
+
+class AdaptiveReadSize:
+    """Read size that follows the backlog on the serial port.
+
+    After every read, call `update` with the number of bytes still waiting.
+    If more is waiting than one read takes, the reader is falling behind and
+    the read size doubles; if the port was drained, it halves again, down to
+    `min_size`, to keep latency low.
+    """
+
+    def __init__(self, min_size, max_size, size=None):
+        self.min_size = min_size
+        self.max_size = max_size
+        self.size = size or min_size
+
+    def update(self, backlog):
+        if backlog > self.size:
+            self.size = min(2 * self.size, self.max_size)
+        elif backlog == 0:
+            self.size = max(self.size // 2, self.min_size)
+        return self.size
+
+
+def _as_uint8(data):
+    if isinstance(data, (bytes, bytearray, memoryview)):
+        return np.frombuffer(data, dtype=np.uint8)
+    return np.asarray(data, dtype=np.uint8)
+
+
+class FrameDecoder:
+    """Vectorized decoder for the SpikerBox byte stream.
+
+    Unlike `process_data`, the decoder keeps state between calls: a frame that
+    is cut in half at the end of one read is completed with the first bytes of
+    the next read instead of being dropped. It also decodes a frame that
+    starts at the very first byte of the stream, which `process_data` skips.
+
+    Multi-channel SpikerBoxes interleave the channels: every frame holds one
+    2-byte sample per channel, and only the very first byte of the frame has
+    its top bit set. With `channels > 1` the decoder returns an array of shape
+    `(samples, channels)`; with one channel it returns a flat array, like
+    `process_data` always did.
+
+    Attributes:
+    frames: Number of frames decoded so far.
+    dropped: Number of bytes skipped while resynchronizing on a frame start
+        (noise on the line, or joining the stream in the middle of a frame).
+    """
+
+    def __init__(self, channels=1):
+        self.channels = channels
+        self.frame_size = FRAME_SIZE * channels
+        self._pending = np.zeros(self.frame_size, dtype=np.uint8)
+        self._n_pending = 0
+        self.frames = 0
+        self.dropped = 0
+
+    def reset(self):
+        self._n_pending = 0
+        self.frames = 0
+        self.dropped = 0
+
+    def decode(self, data):
+        """Decode a chunk of bytes and return the complete samples in it.
+
+        `data` can be a list of ints (as returned by `read_arduino`), bytes,
+        a bytearray/memoryview or a uint8 array; it is never copied.
+        """
+        buf = _as_uint8(data)
+        size = self.frame_size
+        head = self._samples(buf, np.zeros(0, dtype=np.intp))
+
+        # finish the frame left over from the previous chunk
+        if self._n_pending:
+            missing = size - self._n_pending
+            tail = buf[:missing]
+            if np.any(tail > 127):
+                # a new frame starts before the old one is complete
+                self.dropped += self._n_pending
+                self._n_pending = 0
+            elif len(tail) < missing:
+                self._pending[self._n_pending:self._n_pending + len(tail)] = tail
+                self._n_pending += len(tail)
+                return head
+            else:
+                self._pending[self._n_pending:] = tail
+                self._n_pending = 0
+                head = self._samples(self._pending, np.zeros(1, dtype=np.intp))
+                buf = buf[missing:]
+
+        # a frame starts at every byte with the top bit set, and is only valid
+        # if the next frame start is at least one frame size later
+        starts = np.flatnonzero(buf > 127)
+        if len(starts) == 0:
+            self.dropped += len(buf)
+            self.frames += len(head)
+            return head
+
+        gaps = np.diff(starts, append=len(buf))
+        if gaps[-1] < size:
+            # keep the incomplete last frame for the next call
+            n_tail = gaps[-1]
+            self._pending[:n_tail] = buf[starts[-1]:]
+            self._n_pending = n_tail
+            starts, gaps = starts[:-1], gaps[:-1]
+        complete = starts[gaps >= size]
+
+        self.dropped += len(buf) - self._n_pending - size * len(complete)
+        samples = self._samples(buf, complete)
+        if len(head):
+            samples = np.concatenate((head, samples))
+        self.frames += len(samples)
+        return samples
+
+    def _samples(self, buf, starts):
+        if self.channels == 1:
+            high = np.bitwise_and(buf[starts], 127).astype(np.float64)
+            return high * 128 + buf[starts + 1]
+        # (frames, channels, high/low byte) for all channels at once
+        frames = buf[starts[:, None] + np.arange(self.frame_size)]
+        frames = frames.reshape(len(starts), self.channels, FRAME_SIZE)
+        high = np.bitwise_and(frames[:, :, 0], 127).astype(np.float64)
+        return high * 128 + frames[:, :, 1]
+
+
 def process_data(data):
-    data_in = np.array(data)
-    result = []
-    i = 1
-    while i < len(data_in)-1:
-        if data_in[i] > 127:
-            # Found beginning of frame
-            # Extract one sample from 2 bytes
-            intout = (np.bitwise_and(data_in[i],127))*128
-            i = i + 1
-            intout = intout + data_in[i]
-            result = np.append(result,intout)
-        i=i+1
-    return result
-
-def init_serial(cport):
-    # take continuous data stream 
+    """Decode one chunk of bytes into samples.
+
+    This is stateless: frames cut at the chunk edges are lost. As it always
+    did, it ignores the first byte of the chunk, so a frame starting there is
+    lost too. Use a `FrameDecoder` when decoding a continuous stream chunk by
+    chunk.
+    """
+    return FrameDecoder().decode(_as_uint8(data)[1:])
+
+
+def init_serial(cport, timeout=None, channels=1):
+    # "emulator" or "emulator:<recording>" runs without a SpikerBox, see emulator.py;
+    # `channels` only sets how many channels the synthetic signal has
+    if cport.startswith("emulator"):
+        from emulator import open_emulator
+
+        return open_emulator(cport, timeout=timeout, channels=channels)
+    # "hub:<address>" reads the bytes from a hub.py process that owns the port
+    if cport.startswith("hub:"):
+        from hub import HubSerial
+
+        return HubSerial(cport[len("hub:"):], timeout=timeout)
+    # take continuous data stream
     baudrate = 230400
     # cport = 'COM3'  # set the correct port before you run it
-    ser = serial.Serial(port=cport, baudrate=baudrate) 
-    return ser
\ No newline at end of file
+    # timeout=None blocks until a read is complete, 0 never blocks
+    ser = serial.Serial(port=cport, baudrate=baudrate, timeout=timeout)
+    return ser
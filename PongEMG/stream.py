@@ -1,30 +1,157 @@
-from spikerbox_serial import read_arduino, process_data, init_serial
+from spikerbox_serial import (
+    AdaptiveReadSize,
+    ByteRing,
+    FrameDecoder,
+    FRAME_SIZE,
+    SAMPLE_RATE,
+    init_serial,
+    read_arduino_into,
+    read_available,
+)
 import numpy as np
 import pygame
 from pong import Pong
 
-from multiprocessing import Process, Value
-from ctypes import c_double
+from multiprocessing import Process
 
+from features import Pipeline, Rectify, MovingAverage
 from flappy import Flappy
+from acquisition import AcquisitionManager
+from calibration import ThresholdCalibrator
+from events import EVENT_WIDTH, EventReader, OnsetDetector
+from latency import EMG_STAGES, LatencyRecorder, now
+from shared_ring import SharedRing
 
 
 def emg_process_loop(
-    shared_value, cport, inputBufferSize, compute_fn, compute_kwargs=None
+    feature_ring,
+    cport,
+    inputBufferSize,
+    compute_fn,
+    compute_kwargs=None,
+    raw_ring=None,
+    stamp_ring=None,
+    acquisition="blocking",
+    tick=0.005,
+    record_path=None,
+    calibrator=None,
+    threshold_ring=None,
+    channels=1,
+    clock_ring=None,
+    detector=None,
+    event_ring=None,
 ):
-    from spikerbox_serial import read_arduino, process_data, init_serial
+    """Read, decode and process the SpikerBox stream forever.
+
+    `acquisition` selects how the port is read:
+    - "blocking": wait for `inputBufferSize` bytes per read (plus any backlog).
+    - "tick": every `tick` seconds, take whatever bytes are waiting.
+    - "adaptive": read with a `tick` timeout and a read size that grows when
+      bytes pile up on the port and shrinks when the port is drained.
+    The features keep their state between reads, so short reads only make the
+    output fresher, they do not shorten the analysis window.
+
+    If `record_path` is given, every chunk is also saved there (see recorder.py).
+    With a `calibrator` (see calibration.py) the movement threshold is found
+    from the feature and written to `threshold_ring` whenever it changes.
+    With `channels > 1` every ring row holds one value per channel.
+    `clock_ring` receives (arrival time, feature rows published) per chunk,
+    which `acquisition.AcquisitionManager` uses to align several devices.
+    A `detector` (see events.py) turns the feature into onset/offset events
+    that are written to `event_ring`.
+    """
+    from spikerbox_serial import (
+        AdaptiveReadSize,
+        ByteRing,
+        FrameDecoder,
+        init_serial,
+        read_arduino_into,
+        read_available,
+    )
+    from latency import now
+    from recorder import SessionRecorder
+    import time
     import numpy as np
 
     compute_kwargs = compute_kwargs or {}
+    if acquisition not in ("blocking", "tick", "adaptive"):
+        raise ValueError(f"Invalid acquisition mode {acquisition!r}")
 
-    ser = init_serial(cport)
+    ser = init_serial(
+        cport, timeout=None if acquisition == "blocking" else tick, channels=channels
+    )
+    # serial reads land in this buffer, and the decoder works on views of it
+    ring = ByteRing(4 * inputBufferSize)
+    bytes_per_tick = max(FRAME_SIZE, int(tick * FRAME_SIZE * SAMPLE_RATE))
+    read_size = AdaptiveReadSize(bytes_per_tick, ring.capacity // 2)
+    backlog = 0
+    next_tick = now()
+    # keeps frames split across reads instead of dropping them
+    decoder = FrameDecoder(channels)
+    if record_path is not None:
+        recorder = SessionRecorder(
+            record_path, SAMPLE_RATE // channels, channels=channels, width=channels
+        )
+    else:
+        recorder = None
+    phase = None
     while True:
-        data = read_arduino(ser, inputBufferSize)
-        processed = process_data(data)
+        if acquisition == "blocking":
+            data = read_arduino_into(ser, ring, inputBufferSize)
+        elif acquisition == "tick":
+            time.sleep(max(0.0, next_tick - now()))
+            next_tick = max(next_tick + tick, now())
+            data = read_available(ser, ring, ring.capacity // 2)
+        else:
+            # the backlog measured after the last read is still waiting
+            data = ring.readinto(ser, read_size.size, backlog)
+            backlog = ser.in_waiting
+            read_size.update(backlog)
+        t_arrived = now()
+        processed = decoder.decode(data)
         if len(processed) > 0:
-            signal = np.abs(np.array(processed) - 500)
+            t_decoded = now()
+            # center on the SpikerBox baseline, compute_fn does the rest
+            signal = np.subtract(processed, 500, out=processed)
             result = compute_fn(signal, **compute_kwargs)
-            shared_value.value = float(np.mean(result))  # ensure single float
+            t_computed = now()
+            if raw_ring is not None:
+                raw_ring.write(signal)
+            feature_ring.write(result)
+            # the game can read the feature from here on
+            t_published = now()
+            if clock_ring is not None:
+                clock_ring.write((t_arrived, feature_ring.seq))
+            if calibrator is not None:
+                threshold = calibrator.update(result)
+                if calibrator.phase != phase:
+                    phase = calibrator.phase
+                    print(CALIBRATION_PROMPTS[phase])
+                if threshold is not None:
+                    threshold_ring.write(np.reshape(threshold, (1, -1)))
+                    if detector is not None:
+                        detector.set_threshold(threshold)
+            if detector is not None:
+                events = detector.process(result, t_arrived)
+                if len(events):
+                    event_ring.write(events)
+            if recorder is not None:
+                recorder.write(data, signal, result)
+            if stamp_ring is not None:
+                # estimate: at the wire rate, the first byte of the chunk came in
+                # this long before the read returned
+                t_first = t_arrived - len(data) / (FRAME_SIZE * SAMPLE_RATE)
+                stamp_ring.write((t_first, t_arrived, t_decoded, t_computed, t_published))
+        elif recorder is not None and len(data):
+            # no complete frame yet, but raw.bin keeps every byte
+            recorder.write(data, (), ())
+
+
+CALIBRATION_PROMPTS = {
+    "rest": "Calibrating: relax your muscle...",
+    "contract": "Calibrating: now contract your muscle...",
+    "play": "Calibration done, threshold is set. Have fun!",
+}
 
 
 # Running mean volage is just one of several ways you could use the data from this stream.
@@ -36,14 +163,33 @@ def running_mean(data, window_size):
     return (cumsum[window_size:] - cumsum[:-window_size]) / window_size
 
 
+# running_mean above starts over on every chunk. The features in features.py keep
+# their state between chunks; chain them with Pipeline, for example
+#   Pipeline(BandPass(20, 450, SAMPLE_RATE), Rectify(), MovingAverage(500))
+#   Envelope(5, SAMPLE_RATE)
+def make_features():
+    return Pipeline(Rectify(), MovingAverage(window_size=500))
+
+
 ### SET SOME VARIABLES ###
-cport = "COM3"  # set the correct port before you run it
+cport = "COM3"  # set the correct port before you run it, or "emulator" to play without a SpikerBox
 inputBufferSize = 2000  # keep between 2000-20000
 movementThreshold = 24  # start with 1 std above running mean
 playerPaddle = 200  # refers to paddle size, default is 100
 cpuPlayStyle = "following"  # options are 'following' or 'random'
 game_choice = "flappy"  # Choose your game! Options are "flappy" or "pong"
 use_emg = True
+ringSeconds = 5  # how much recent signal the game process can look at
+measureLatency = True  # print EMG-to-screen latency percentiles on exit
+latencyLog = None  # or a file name, e.g. "latency.csv", to save every measurement
+acquisitionMode = "blocking"  # 'blocking', 'tick' or 'adaptive' (lower latency)
+acquisitionTick = 0.005  # seconds between reads in the 'tick' and 'adaptive' modes
+recordSession = None  # or a new folder name, e.g. "sessions/run1", to save the EMG stream
+autoCalibrate = False  # find movementThreshold at the start instead (rest, then contract)
+calibrationSeconds = 5  # length of the rest and the contraction phase
+channels = 1  # SpikerBox channels; with 2, channel 0 moves the paddle up and channel 1 down
+player2Port = None  # e.g. "COM4": a second SpikerBox plays the right paddle in pong
+useEvents = False  # react to every detected contraction instead of the level once per frame
 ###
 
 
@@ -55,36 +201,170 @@ def main():
     # game_choice = "flappy"  # or "pong"
     if game_choice == "flappy":
         game = Flappy()
+    elif game_choice == "pong" and player2Port is not None and use_emg:
+        return two_player_main()
     elif game_choice == "pong":
         game = Pong(cpuPlayStyle="following")
         game.set_new_paddle(playerPaddle)
     else:
         raise ValueError("Invalid game_choice")
 
-    # Shared EMG signal value
+    # Shared EMG signal: the last few seconds of raw samples and features
 
     if use_emg:
-        emg_mean = Value(c_double, 0.0)
+        # every channel gets SAMPLE_RATE // channels rows per second
+        rate = SAMPLE_RATE // channels
+        raw_ring = SharedRing(ringSeconds * rate, width=channels)
+        feature_ring = SharedRing(ringSeconds * rate, width=channels)
+        rings = [raw_ring, feature_ring]
+        kwargs = {"raw_ring": raw_ring, "channels": channels}
+        if measureLatency:
+            # one row of stage timestamps per chunk
+            stamp_ring = SharedRing(1024, width=len(EMG_STAGES))
+            rings.append(stamp_ring)
+            kwargs["stamp_ring"] = stamp_ring
+            latency = LatencyRecorder()
+        else:
+            stamp_ring = latency = None
+        kwargs["acquisition"] = acquisitionMode
+        kwargs["tick"] = acquisitionTick
+        kwargs["record_path"] = recordSession
+        if autoCalibrate:
+            threshold_ring = SharedRing(16, width=channels)
+            rings.append(threshold_ring)
+            kwargs["threshold_ring"] = threshold_ring
+            kwargs["calibrator"] = ThresholdCalibrator(
+                rate, rest_s=calibrationSeconds, contract_s=calibrationSeconds
+            )
+        else:
+            threshold_ring = None
+        if useEvents:
+            event_ring = SharedRing(256, width=EVENT_WIDTH)
+            rings.append(event_ring)
+            kwargs["event_ring"] = event_ring
+            # with autoCalibrate, the detector waits for the calibrated threshold
+            kwargs["detector"] = OnsetDetector(
+                None if autoCalibrate else movementThreshold, rate
+            )
+            events = EventReader(event_ring)
+        else:
+            events = None
         proc = Process(
             target=emg_process_loop,
-            args=(emg_mean, cport, inputBufferSize, running_mean),
-            kwargs={"compute_kwargs": {"window_size": 500}},
+            args=(feature_ring, cport, inputBufferSize, make_features()),
+            kwargs=kwargs,
         )
         proc.start()
     else:
-        emg_mean = None
+        proc = feature_ring = stamp_ring = latency = threshold_ring = events = None
+        rings = []
 
+    try:
+        game_loop(game, feature_ring, stamp_ring, latency, threshold_ring, events)
+    finally:
+        if proc is not None:
+            # terminate() is not enough: the child inherits SDL's SIGTERM handler
+            proc.kill()
+        if latency is not None:
+            latency.print_summary()
+            if latencyLog:
+                latency.dump(latencyLog)
+        for ring in rings:
+            ring.close()
+            ring.unlink()
+
+
+def two_player_main():
+    # one EMG player per SpikerBox, each read by its own process
+    unsupported = [
+        name
+        for name, value in (
+            ("autoCalibrate", autoCalibrate),
+            ("useEvents", useEvents),
+            ("recordSession", recordSession),
+        )
+        if value
+    ]
+    if unsupported:
+        raise ValueError(f"two-player Pong does not support {', '.join(unsupported)} yet")
+    if measureLatency:
+        print("Latency is not measured in two-player Pong.")
+    game = Pong(cpuPlayStyle="emg")
+    game.set_new_paddle(playerPaddle)
+    manager = AcquisitionManager(
+        [cport, player2Port],
+        inputBufferSize,
+        make_features,
+        channels=channels,
+        ring_seconds=ringSeconds,
+        acquisition=acquisitionMode,
+        tick=acquisitionTick,
+    )
+    manager.start()
+    window = inputBufferSize // (FRAME_SIZE * channels)
+    try:
+        while True:
+            # both players' features, taken at the same moment
+            p1_val, p2_val = manager.aligned_means(window)
+            game.handle_input(_per_channel(p1_val), movementThreshold)
+            game.p2_handle_input(_per_channel(p2_val), movementThreshold)
+
+            for event in pygame.event.get():
+                if event.type == pygame.QUIT:
+                    pygame.quit()
+                    exit()
+                game.handle_window_event(event)
+
+            game.update()
+            game.draw()
+    finally:
+        manager.stop()
+
+
+def _per_channel(values):
+    # a plain float for one channel, an array with one value per channel otherwise
+    return float(values[0]) if channels == 1 else values.copy()
+
+
+def game_loop(
+    game, feature_ring, stamp_ring=None, latency=None, threshold_ring=None, events=None
+):
+    last_chunk = 0  # stamp_ring.seq of the last chunk handed to the game
+    threshold = movementThreshold
     # Main game loop
     while True:
 
-        if use_emg:
-            emg_val = emg_mean.value
+        if threshold_ring is not None:
+            if threshold_ring.seq == 0:
+                # still calibrating, keep the game paused
+                if events is not None:
+                    # contractions asked for by the calibration are not moves
+                    events.poll()
+                for event in pygame.event.get():
+                    if event.type == pygame.QUIT:
+                        pygame.quit()
+                        exit()
+                    game.handle_window_event(event)
+                game.draw()
+                continue
+            threshold = _per_channel(threshold_ring.latest(1)[0])
+
+        if feature_ring is not None:
+            # average over about one read worth of samples
+            window = feature_ring.latest(inputBufferSize // (FRAME_SIZE * channels))
+            emg_val = _per_channel(window.mean(axis=0)) if len(window) else 0.0
+            if stamp_ring is not None and stamp_ring.seq > last_chunk:
+                last_chunk = stamp_ring.seq
+                chunk_stamps = stamp_ring.latest(1)[0]
+                t_consumed = now()
+            else:
+                chunk_stamps = None
         else:
             keys = pygame.key.get_pressed()
             emg_val = movementThreshold + 10 if keys[pygame.K_SPACE] else 0
 
         # if use_emg:
-        #     emg_val = emg_mean.value
+        #     emg_val = feature_ring.latest(1)[0, 0]
         # else:
         #     keys = pygame.key.get_pressed()
         #     if keys[pygame.K_SPACE]:
@@ -92,12 +372,18 @@ def main():
         #     else:
         #         emg_val = 0  # simulate resting baseline
 
-        game.handle_input(emg_val, movementThreshold)
+        if events is not None:
+            # every contraction since the last frame, in order
+            for t, kind, channel, value in events.poll():
+                game.handle_emg_event(kind, int(channel))
+        else:
+            game.handle_input(emg_val, threshold)
 
         for event in pygame.event.get():
             if event.type == pygame.QUIT:
                 pygame.quit()
                 exit()
+            game.handle_window_event(event)
             if hasattr(game, "p2_handle_event"):  # only Pong has this
                 game.p2_handle_event(event)
 
@@ -108,6 +394,8 @@ def main():
 
         game.update()
         game.draw()
+        if latency is not None and chunk_stamps is not None:
+            latency.record(chunk_stamps, t_consumed, game.flip_time)
 
         if getattr(game, "done", False):
             print("Game over!")